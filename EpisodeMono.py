@@ -3,8 +3,31 @@ import os
 import sys
 import subprocess
 import re
+import time
+import socket
+import select
+import httplib
+import threading
+import Queue
+import BaseHTTPServer
+import mmap
+import struct
+import array
+import itertools
+import tempfile
+import shutil
+import zlib
+import sqlite3
+import csv
+import codecs
+import hashlib
+import json
+import argparse
 import datetime
 import Tkinter as tk
+import ttk
+import tkFileDialog
+import tkMessageBox
 
 
 def focus_next_widget(event):
@@ -100,30 +123,142 @@ class WideFrame(BaseFrame):
         BaseFrame.__init__(self, window, *args, **kwargs)
         self.pack(fill=tk.X, expand=1)
 
+# Per-field validation. Every kind of field gets one precompiled validator, EntryCustom runs
+# its validator on each keystroke and that's what decides whether the field is ready, and
+# validate_record runs the very same validators over batch records before they're rendered.
+class FieldValidator(object):
+    __slots__ = ('pattern', 'message')
+
+    def __init__(self, pattern, message):
+        self.pattern = re.compile(pattern, re.IGNORECASE)
+        self.message = message
+
+    # Returns None when the value is fine, otherwise what's wrong with it.
+    def __call__(self, value):
+        if self.pattern.match(value):
+            return None
+        return self.message
+
+
+GUEST_NAME = r"[^\s,&](?:[^,&]*[^\s,&])?"
+TIMECODE = r"\d{1,2}:\d{2}(?::\d{2})?"
+FIELD_VALIDATORS = {
+    "text": FieldValidator(r"^\s*\S", "can't be empty"),
+    # Anything after the last " - " is the guest list, "A", "A & B" or "A, B & C". Every episode
+    # has one, it's what goes in the site email subject.
+    "title": FieldValidator(r"^.*\S.* - {0}(?:(?:, | & ){0})*$".format(GUEST_NAME),
+                            "should look like \"Title - Guest\" or \"Title - A, B & C\""),
+    "number": FieldValidator(r"^0*[1-9]\d{0,3}$", "should be a number like 7 or 007"),
+    "uuid": FieldValidator(r"^[0-9a-f]{8}-?[0-9a-f]{4}-?[0-9a-f]{4}-?[0-9a-f]{4}-?[0-9a-f]{12}$",
+                           "isn't a UUID"),
+    "timecodes": FieldValidator(r"^{0}(?:, {0})*$".format(TIMECODE), "should be timecodes like 12:34, 45:01"),
+}
+
+EPISODE_RECORD_FIELDS = (("title", "title"), ("season", "number"), ("number", "number"), ("uuid", "uuid"))
+CLIP_RECORD_FIELDS = ("title", "text"), ("description", "text"), ("uuid", "uuid")
+PODCAST_RECORD_FIELDS = (("title", "text"), ("description", "text"), ("preroll_ads", "text"),
+                         ("adlocations", "timecodes"), ("midroll_ads", "text"), ("postroll_ads", "text"))
+
+
+def validate_field(kind, value):
+    return FIELD_VALIDATORS[kind](value)
+
+
+# Everything wrong with a batch record, as "field: problem" strings. An empty list means it's
+# safe to render.
+def validate_record(record):
+    if not isinstance(record, dict):
+        return ["record: must be a JSON object"]
+    problems = []
+    for field, kind in EPISODE_RECORD_FIELDS:
+        problem = validate_field(kind, record_text(record.get(field)))
+        if problem is not None:
+            problems.append("{}: {}".format(field, problem))
+    # These get hashed and parsed as they are, so anything but a string would blow up later.
+    bad_dates = False
+    for field in ("show", "date", "aired_at"):
+        if record.get(field) is not None and not isinstance(record[field], basestring):
+            problems.append("{}: must be a string".format(field))
+            bad_dates = True
+    clips = record.get("clips") or []
+    if not isinstance(clips, (list, tuple)):
+        problems.append("clips: must be a list")
+        clips = []
+    if len(clips) > MAX_CLIPS:
+        problems.append("clips: at most {} clips".format(MAX_CLIPS))
+    for n, clip in enumerate(clips, 1):
+        if not isinstance(clip, (dict, list, tuple)) or (not isinstance(clip, dict) and len(clip) != 3):
+            problems.append("clip {}: should be {{title, description, uuid}}".format(n))
+            continue
+        for (field, kind), value in zip(CLIP_RECORD_FIELDS, record_clips({"clips": [clip]})[0]):
+            problem = validate_field(kind, value)
+            if problem is not None:
+                problems.append("clip {} {}: {}".format(n, field, problem))
+    pod_record = record.get("podcast")
+    if pod_record:
+        if not isinstance(pod_record, dict):
+            problems.append("podcast: must be a JSON object")
+        else:
+            for field, kind in PODCAST_RECORD_FIELDS:
+                if field == "adlocations":
+                    value = ", ".join(record_adlocations(pod_record))
+                else:
+                    value = record_text(pod_record.get(field))
+                problem = validate_field(kind, value)
+                if problem is not None:
+                    problems.append("podcast {}: {}".format(field, problem))
+    if not bad_dates:
+        try:
+            air_dates.for_record(record)
+        except ValueError as error:
+            problems.append("date: {}".format(error))
+    return problems
+
+
 # Subclassing tk.Entry to include a settable placeholder text.
 class EntryCustom(tk.Entry):
-    def __init__(self, window, label, **kwargs):
+    def __init__(self, window, label, kind="text", **kwargs):
         self.input = tk.StringVar()
         tk.Entry.__init__(self, window, textvariable=self.input, **kwargs)
         # self.config(bg="#1b1b1b", fg="#dedede", disabledbackground="#1b1b1b", disabledforeground="#646464")
         self.output = tk.StringVar()
         self.ready = tk.BooleanVar()
         self.placeholder_state = None
+        self.autofilled = None
         self.label = label
         self.placeholder = "{}...".format(label)
+        self.validator = FIELD_VALIDATORS[kind]
+        self.problem = None
         self.add_placeholder(self.placeholder)
         self.input.trace('w', self.get_text)
 
         self.pack(fill=tk.X, expand=1)
 
+    # Only this field gets revalidated on a keystroke, and the frames just AND together their
+    # fields' ready flags, so typing stays cheap no matter how many fields there are.
     # noinspection PyUnusedLocal
     def get_text(self, *args, **kwargs):
-        if self.input.get() != ("" or self.label):
-            self.output.set(self.input.get())
-            if self.output.get() != "":
-                self.ready.set(True)
-            else:
-                self.ready.set(False)
+        value = self.input.get()
+        if value == self.placeholder_state.placeholder_text:
+            value = ""
+        self.problem = self.validator(value) if value != "" else None
+        self.output.set(value)
+        self.ready.set(value != "" and self.problem is None)
+        if value != "":
+            self.config(fg="red" if self.problem is not None else self.placeholder_state.normal_color)
+
+    # Fills in a value we looked up for the user (like a UUID from the CMS index), but only
+    # if the field is still empty or still holds the last thing we filled in ourselves.
+    def autofill(self, value):
+        if value is None:
+            return
+        current = self.input.get()
+        if not (self.placeholder_state.with_placeholder or current == "" or current == self.autofilled):
+            return
+        self.placeholder_state.with_placeholder = False
+        self.config(fg=self.placeholder_state.normal_color, font=self.placeholder_state.normal_font)
+        self.autofilled = value
+        self.input.set(value)
 
     class PlaceholderState(object):
         __slots__ = ('normal_color', 'normal_font', 'placeholder_text',
@@ -193,19 +328,20 @@ class EpisodeFrame(WideFrame):
         self.ready = tk.BooleanVar()
         self.fields = []
         WideFrame.__init__(self, window, *args, **kwargs)
-        self.ep_title = EntryCustom(self, "Episode Title")
+        self.ep_title = EntryCustom(self, "Episode Title", "title")
         self.ep_guest = EntryCustom(self, "Episode Guest")
         self.ep_guest.configure(takefocus=False)
-        self.ep_season = EntryCustom(self, "Season")
-        self.ep_number = EntryCustom(self, "Episode Airing Order")
-        self.ep_uuid = EntryCustom(self, "Episode UUID")
+        self.ep_season = EntryCustom(self, "Season", "number")
+        self.ep_number = EntryCustom(self, "Episode Airing Order", "number")
+        self.ep_uuid = EntryCustom(self, "Episode UUID", "uuid")
         self.fields.extend([self.ep_title, self.ep_season, self.ep_number, self.ep_uuid])
         [field.ready.trace('w', self.ready_set) for field in self.fields]
 
+    # The guest field is filled in from the title, and the title isn't valid without a guest,
+    # so the guest field doesn't need its own say in whether the episode is ready.
     # noinspection PyUnusedLocal
     def ready_set(self, *args, **kwargs):
         if self.ep_title.ready.get() and \
-                self.ep_guest.ready.get() and \
                 self.ep_season.ready.get() and \
                 self.ep_number.ready.get() and \
                 self.ep_uuid.ready.get():
@@ -251,7 +387,7 @@ class PodFrame(WideFrame):
         self.pod_title = EntryCustom(self, "Podcast Title")
         self.pod_description = EntryCustom(self, "Podcast Description")
         self.pod_preroll_adv = EntryCustom(self, "Pre-Roll Advertisers")
-        self.pod_adlocations = EntryCustom(self, "Mid/Post-Roll AdLocations")
+        self.pod_adlocations = EntryCustom(self, "Mid/Post-Roll AdLocations", "timecodes")
         self.pod_midroll_adv = EntryCustom(self, "Mid-Roll Advertisers")
         self.pod_postroll_adv = EntryCustom(self, "Post-Roll Advertisers")
         self.fields.extend([self.pod_title,
@@ -289,7 +425,7 @@ class ClipsFrame(FullFrame):
             self.total_clips = total_clips
             self.title = EntryCustom(self, "Clip {} Title".format(self.number))
             self.description = EntryCustom(self, "Clip {} Description".format(self.number))
-            self.uuid = EntryCustom(self, "Clip {} UUID".format(self.number))
+            self.uuid = EntryCustom(self, "Clip {} UUID".format(self.number), "uuid")
             self.fields.extend([self.title, self.description, self.uuid])
             [field.ready.trace('w', self.ready_set) for field in self.fields]
 
@@ -323,15 +459,12 @@ class ClipsFrame(FullFrame):
             else:
                 clip.active.set(True)
                 clip.pack(pady=(0, 10), fill=tk.X, expand=1)
+        self.ready_set()
 
+    # Ready when every clip that's showing is ready.
     # noinspection PyUnusedLocal
     def ready_set(self, *args, **kwargs):
-        for clip in self.clips[1:]:
-            if clip.active.get():
-                if clip.ready.get():
-                    self.ready.set(True)
-                else:
-                    self.ready.set(False)
+        self.ready.set(all(clip.ready.get() for clip in self.clips[1:] if clip.active.get()))
 
 
 class ResultFrame(FullFrame):
@@ -355,6 +488,15 @@ class EpisodeURLFrame(ResultFrame):
         self.episode_url.configure(wrap=tk.NONE)
         self.episode_url.pack_configure(fill=tk.X)
         self.pack_configure(fill=tk.X, expand=0)
+        # Only shown when a sitemap is loaded and one of the links isn't on it.
+        self.link_status = tk.Label(self, anchor=tk.W, fg="red", justify=tk.LEFT)
+
+    def show_link_problems(self, problems):
+        if problems:
+            self.link_status.configure(text="\n".join(problems))
+            self.link_status.pack(fill=tk.X, side=tk.BOTTOM)
+        else:
+            self.link_status.pack_forget()
 
     def copy_to_clipboard(self):
         url = self.episode_url.get('1.0', 'end'+'-1c')
@@ -415,17 +557,18 @@ class MainUILayout(FullFrame):
                                      text="a.k.a. TITLE1",
                                      anchor=tk.S)
             self.subtitle.pack()
+            self.new_tab_button = tk.Button(self, text="New Tab", takefocus=False)
+            self.new_tab_button.place(relx=0, x=10, rely=0.5, anchor=tk.W)
+            self.close_tab_button = tk.Button(self, text="Close Tab", takefocus=False)
+            self.close_tab_button.place(relx=1, x=-10, rely=0.5, anchor=tk.E)
 
+    # Each tab is an EpisodeWorkspace.
     class MiddleFrame(FullFrame):
         def __init__(self, window, *args, **kwargs):
             FullFrame.__init__(self, window, *args, **kwargs)
             self.pack_configure(padx=10)
-            self.input_frame_left = FullFrame(self)
-            self.input_frame_left.pack_configure(padx=(0, 5), side=tk.LEFT)
-            self.input_frame_right = FullFrame(self)
-            self.input_frame_right.pack_configure(padx=(5, 0), side=tk.LEFT)
-            self.results_frame = FullFrame(self)
-            self.results_frame.pack_configure(padx=10, side=tk.RIGHT)
+            self.tabs = ttk.Notebook(self, takefocus=False)
+            self.tabs.pack(fill=tk.BOTH, expand=1)
 
     class BottomFrame(BaseFrame):
         def __init__(self, window, *args, **kwargs):
@@ -433,6 +576,14 @@ class MainUILayout(FullFrame):
             self.pack(fill=tk.X, pady=(5, 10))
             self.username = EntryCustom(self, "Enter your name (First Last)...")
             self.username.pack(side=tk.LEFT, expand=0, padx=30)
+            self.cms_button = tk.Button(self, text="Load CMS Export...", takefocus=False)
+            self.cms_button.pack(side=tk.LEFT)
+            self.cms_status = tk.Label(self, anchor=tk.W)
+            self.cms_status.pack(side=tk.LEFT, padx=10)
+            self.sitemap_button = tk.Button(self, text="Load Sitemap...", takefocus=False)
+            self.sitemap_button.pack(side=tk.LEFT)
+            self.sitemap_status = tk.Label(self, anchor=tk.W)
+            self.sitemap_status.pack(side=tk.LEFT, padx=10)
             self.change_title = tk.BooleanVar()
             tk.Checkbutton(self, variable=self.change_title, takefocus=False, anchor=tk.N).pack(side=tk.RIGHT, padx=30)
             tk.Label(self, text="Change the Title...").pack(side=tk.RIGHT)
@@ -444,11 +595,121 @@ class MainUILayout(FullFrame):
         self.bottom_frame = self.BottomFrame(self)
 
 
-def episode_date():
-    now = datetime.datetime.now()
-    if now.strftime("%H:%M:%S") < datetime.time(12, 0).strftime("%H:%M:%S"):
-        now = now - datetime.timedelta(days=1)
-    return now.strftime("%m/%d/%y")
+# Air dates. The emails go out the morning after a show airs, so until a show's cutoff time
+# "today's episode" is still yesterday's. Each show has its own cutoff, the app uses the
+# current date (cached until the next cutoff, so it's right even if the app stays open past
+# noon), and batch records can carry their own "date" (MM/DD/YY or YYYY-MM-DD) or "aired_at"
+# (YYYY-MM-DDTHH:MM[:SS]) instead.
+
+DEFAULT_SHOW = "Title 1"
+SHOW_CUTOFFS = {"Title 1": datetime.time(12, 0),
+                "Title 2": datetime.time(12, 0)}
+DATE_FORMAT = "%m/%d/%y"
+DATE_INPUT_FORMATS = (DATE_FORMAT, "%Y-%m-%d")
+AIRED_AT_FORMATS = ("%Y-%m-%dT%H:%M:%S", "%Y-%m-%dT%H:%M", "%Y-%m-%d %H:%M:%S", "%Y-%m-%d %H:%M")
+AIR_DATE_MEMO_SIZE = 4096
+
+
+class AirDates(object):
+    def __init__(self, cutoffs=SHOW_CUTOFFS, clock=datetime.datetime.now):
+        self.cutoffs = cutoffs
+        self.clock = clock
+        # show -> (air date, valid from, valid until)
+        self.current = {}
+
+    def cutoff(self, show=None):
+        return self.cutoffs.get(show or DEFAULT_SHOW, self.cutoffs[DEFAULT_SHOW])
+
+    def for_datetime(self, moment, show=None):
+        if moment.time() < self.cutoff(show):
+            moment = moment - datetime.timedelta(days=1)
+        return moment.strftime(DATE_FORMAT)
+
+    # The date only changes at the cutoff, so between cutoffs this is a dict lookup.
+    def today(self, show=None):
+        now = self.clock()
+        current = self.current.get(show)
+        if current is not None and current[1] <= now < current[2]:
+            return current[0]
+        boundary = datetime.datetime.combine(now.date(), self.cutoff(show))
+        if now < boundary:
+            valid_from, valid_until = boundary - datetime.timedelta(days=1), boundary
+        else:
+            valid_from, valid_until = boundary, boundary + datetime.timedelta(days=1)
+        air_date = self.for_datetime(now, show)
+        self.current[show] = (air_date, valid_from, valid_until)
+        return air_date
+
+    def next_change(self, show=None):
+        self.today(show)
+        return self.current[show][2]
+
+    @staticmethod
+    def parse(value, formats):
+        value = record_text(value).strip()
+        for date_format in formats:
+            try:
+                return datetime.datetime.strptime(value, date_format)
+            except ValueError:
+                pass
+        raise ValueError("Unrecognized date: {}".format(value))
+
+    def for_record(self, record):
+        show = record.get("show") or None
+        if record.get("date"):
+            return self.parse(record["date"], DATE_INPUT_FORMATS).strftime(DATE_FORMAT)
+        elif record.get("aired_at"):
+            return self.for_datetime(self.parse(record["aired_at"], AIRED_AT_FORMATS), show)
+        else:
+            return self.today(show)
+
+    # Fills in "date" on a whole stream of records in one pass. Records mostly share a handful
+    # of dates, so each distinct (show, date, aired_at) is only worked out once, and everything
+    # without its own date gets the same "today" even if the batch runs across a cutoff.
+    def resolve(self, records):
+        memo = {}
+        for record in records:
+            if not isinstance(record, dict):
+                yield record
+                continue
+            try:
+                key = (record.get("show"), record.get("date"), record.get("aired_at"))
+                air_date = memo.get(key)
+                if air_date is None:
+                    if len(memo) >= AIR_DATE_MEMO_SIZE:
+                        memo.clear()
+                    air_date = memo[key] = self.for_record(record)
+            except (ValueError, TypeError):
+                # Leave it for validate_record to report.
+                yield record
+                continue
+            record["date"] = air_date
+            yield record
+
+
+air_dates = AirDates()
+
+
+def episode_date(show=None):
+    return air_dates.today(show)
+
+
+# Slugs get rebuilt for the same few titles on every keystroke in every tab, so they're
+# memoized here for the whole process. The cache just starts over if it ever gets big.
+SLUG_CACHE_SIZE = 4096
+SLUG_NON_WORD = re.compile(r'[\W]')
+SLUG_DASHES = re.compile(r'-{2,}')
+slug_cache = {}
+
+
+def slugify(title):
+    slug = slug_cache.get(title)
+    if slug is None:
+        if len(slug_cache) >= SLUG_CACHE_SIZE:
+            slug_cache.clear()
+        slug = SLUG_DASHES.sub('-', SLUG_NON_WORD.sub('-', title.lower()))
+        slug_cache[title] = slug
+    return slug
 
 
 class Episode(object):
@@ -459,17 +720,21 @@ class Episode(object):
     guest_str = str(None)
     clip_info = []
     username = str(None)
-    date = episode_date()
+    show = DEFAULT_SHOW
+    air_date = None
 
     class Clip(object):
         total_clips = None
         guest_list = None
 
-        def __init__(self, number=None, title=None, description=None, uuid=None):
+        def __init__(self, number=None, title=None, description=None, uuid=None, total_clips=None,
+                     guest_list=None):
             self.number = number
             self.title = title
             self.description = description
             self.uuid = uuid
+            self.total_clips = total_clips
+            self.guest_list = guest_list
 
         def update_clip(self, title, description, uuid):
             self.title = title
@@ -487,7 +752,7 @@ class Episode(object):
         @property
         def url(self):
             return "https://www.website.com/episode-clips/{0}/the-episode-title-{1}".format(
-                self.uuid, re.sub(r'-{2,}', '-', re.sub(r'[\W]', '-', self.title.lower())))
+                self.uuid, slugify(self.title))
 
         @property
         def publish_email_string(self):
@@ -496,10 +761,7 @@ class Episode(object):
             elif self.title.endswith(" - Extended"):
                 return "Extended: {}".format(self.url)
             else:
-                if len(self.guest_list) > 1:
-                    if any(guest in self.guest_list for guest in self.title):
-                        return "Non-extended: {}".format(self.url)
-                elif self.guest_list[0] in self.title:
+                if any(guest in self.title for guest in self.guest_list):
                     return "Non-extended: {}".format(self.url)
                 else:
                     return "Clip {}: {}".format(self.number, self.url)
@@ -522,9 +784,9 @@ class Episode(object):
             return """{0}\n{1}\n{2}\n""".format(self.title, self.description, self.url)
 
     def __init__(self):
-        self.clip_info.append(None)
-        self.Clip.total_clips = self.clip_info[0]
-        self.Clip.guest_list = self.guest_list
+        # Each Episode gets its own clip list, otherwise every new Episode keeps
+        # appending to the one list on the class.
+        self.clip_info = [None]
 
     @property
     def guest_list(self):
@@ -535,13 +797,18 @@ class Episode(object):
         elif self.title.rfind(" - ") > -1:
             guests = self.title[(self.title.rfind(" - ") + 3):]
             if guests.rfind(" & ") > -1 or guests.rfind(", ") > -1:
-                guests.replace(" & ", ", ")
+                guests = guests.replace(" & ", ", ")
                 return guests.split(", ")
             else:
                 return [guests]
         else:
             pass
 
+    # An explicit air_date wins, otherwise it's whatever today's episode is for the show.
+    @property
+    def date(self):
+        return self.air_date or episode_date(self.show)
+
     @property
     def guest(self):
         if self.guest_list is None or self.guest_list == ["Episode Guest..."]:
@@ -563,15 +830,16 @@ class Episode(object):
         else:
             return "https://www.website.com/full-episodes/{0}/the-episode-title-{1}-season-{2}-ep-{3}".format(
                 self.uuid,
-                re.sub(r'-{2,}', '-', re.sub(r'[\W]', '-', self.title.lower())),
+                slugify(self.title),
                 self.season.lstrip("0"),
                 self.number.lstrip("0"))
 
     @property
     def clips(self):
-        if len(self.clip_info) > 2:
-            clips = [self.Clip(n, self.clip_info[n][0], self.clip_info[n][1],
-                               self.clip_info[n][2]) for n in range(1, self.clip_info[0] + 1)]
+        if len(self.clip_info) > 1:
+            guest_list = self.guest_list
+            clips = [self.Clip(n, self.clip_info[n][0], self.clip_info[n][1], self.clip_info[n][2],
+                               self.clip_info[0], guest_list) for n in range(1, self.clip_info[0] + 1)]
             # noinspection PyTypeChecker
             clips.insert(0, self.clip_info[0])
             return clips
@@ -632,9 +900,15 @@ Best,<br>{3}""".format(self.date, "<p>".join(
                        self.email_script_string, self.username)
 
 
-class Podcast:
+class Podcast(object):
     username = str(None)
-    date = episode_date
+    show = DEFAULT_SHOW
+    air_date = None
+
+    # An explicit air_date wins, otherwise it's whatever today's episode is for the show.
+    @property
+    def date(self):
+        return self.air_date or episode_date(self.show)
 
     def __init__(self,
                  title=None,
@@ -697,33 +971,1363 @@ id1234567890?mt=2</a><p>Best,<br>{7}""".format(self.title,
                                                self.username)
 
 
-class EpisodeApp(Window):
-    def __init__(self, *args, **kwargs):
-        Window.__init__(self, *args, **kwargs)
-        self.title("Title 1")
-        self.main_ui = MainUILayout(self)
+# Everything below the GUI classes that turns plain records (dicts, one per episode) into
+# the same outputs the Text widgets show, so the CMS import jobs don't need the app open.
+#
+# A record looks like:
+#   {"title": "...", "season": "24", "number": "012", "uuid": "...", "username": "First Last",
+#    "clips": [{"title": "...", "description": "...", "uuid": "..."}, ...],
+#    "podcast": {"title": "...", "description": "...", "preroll_ads": "...",
+#                "adlocations": "12:34, 45:01", "midroll_ads": "...", "postroll_ads": "..."}}
+
+MAX_CLIPS = 5
+EXPORT_BUFFER_SIZE = 1 << 16
+EXPORT_FORMATS = ("ndjson", "csv")
+OUTPUT_FIELDS = ("season", "number", "ep_uuid", "url", "clip_urls", "publish_email_1",
+                 "site_email_subject", "site_email_body", "podcast_subject", "podcast_body")
+
+
+# Tk and json both hand back unicode for anything non-ASCII, and str.format chokes on that,
+# so everything going into the logic classes gets flattened to UTF-8 first.
+def record_text(value):
+    if value is None:
+        return ""
+    elif isinstance(value, unicode):
+        return value.encode("utf-8")
+    else:
+        return str(value)
+
+
+# Clips can come in as {"title": ..., "description": ..., "uuid": ...} or [title, description, uuid].
+def record_clips(record):
+    clips = []
+    for clip in record.get("clips") or []:
+        if isinstance(clip, dict):
+            clip = (clip.get("title"), clip.get("description"), clip.get("uuid"))
+        clips.append(tuple(record_text(value) for value in clip))
+    return clips
+
+
+# Ad locations can be a list or the same "12:34, 45:01" string typed into the app.
+def record_adlocations(pod_record):
+    adlocations = pod_record.get("adlocations") or ""
+    if isinstance(adlocations, (list, tuple)):
+        return [record_text(location) for location in adlocations]
+    else:
+        return record_text(adlocations).split(", ")
+
+
+def episode_from_record(record):
+    ep_logic = Episode()
+    ep_logic.username = record_text(record.get("username"))
+    ep_logic.title = record_text(record.get("title"))
+    ep_logic.season = record_text(record.get("season"))
+    ep_logic.number = record_text(record.get("number"))
+    ep_logic.uuid = record_text(record.get("uuid"))
+    ep_logic.show = record.get("show") or DEFAULT_SHOW
+    ep_logic.air_date = air_dates.for_record(record)
+    clips = record_clips(record)
+    ep_logic.clip_info[0] = len(clips)
+    ep_logic.clip_info[1:] = clips
+    return ep_logic
+
+
+def podcast_from_record(record):
+    pod_record = record.get("podcast")
+    if not pod_record:
+        return None
+    pod_logic = Podcast(title=record_text(pod_record.get("title")),
+                        description=record_text(pod_record.get("description")),
+                        pre_roll_ads=record_text(pod_record.get("preroll_ads")),
+                        adlocations=record_adlocations(pod_record),
+                        mid_roll_ads=record_text(pod_record.get("midroll_ads")),
+                        post_roll_ads=record_text(pod_record.get("postroll_ads")))
+    pod_logic.username = record_text(pod_record.get("username", record.get("username")))
+    pod_logic.show = record.get("show") or DEFAULT_SHOW
+    pod_logic.air_date = air_dates.for_record(record)
+    return pod_logic
+
+
+# The same outputs update_results puts in the Text widgets, as one flat row.
+def render_outputs(ep_logic, pod_logic=None):
+    row = dict.fromkeys(OUTPUT_FIELDS)
+    row["season"] = ep_logic.season
+    row["number"] = ep_logic.number
+    row["ep_uuid"] = ep_logic.uuid
+    row["url"] = ep_logic.url
+    if ep_logic.clip_info[0]:
+        row["clip_urls"] = [clip.url for clip in ep_logic.clips[1:]]
+        row["publish_email_1"] = ep_logic.publish_email_1
+        row["site_email_subject"] = ep_logic.site_email_subject
+        row["site_email_body"] = ep_logic.site_email_body
+    else:
+        row["clip_urls"] = []
+    if pod_logic is not None:
+        row["podcast_subject"] = pod_logic.subject
+        row["podcast_body"] = pod_logic.body
+    return row
+
+
+def render_record(record):
+    return render_outputs(episode_from_record(record), podcast_from_record(record))
+
+
+# Reads NDJSON records one line at a time so a whole season never has to sit in memory.
+# A line that isn't valid JSON goes to rejected(line, problems) when there is one, so it
+# doesn't take the rest of the file down with it.
+def iter_records(stream, rejected=None):
+    for line_number, line in enumerate(stream, 1):
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            record = json.loads(line)
+        except ValueError as error:
+            if rejected is None:
+                raise
+            rejected(line, ["line {}: invalid JSON: {}".format(line_number, error)])
+            continue
+        yield record
+
+
+# Writes rendered rows as they come in. Nothing is kept around between rows, the
+# file object's buffer is the only thing holding output before it hits disk.
+class OutputWriter(object):
+    def __init__(self, stream, output_format="ndjson", fields=OUTPUT_FIELDS):
+        if output_format not in EXPORT_FORMATS:
+            raise ValueError("Unknown export format: {}".format(output_format))
+        self.stream = stream
+        self.output_format = output_format
+        self.fields = fields
+        self.count = 0
+        self.csv_writer = None
+        if output_format == "csv":
+            self.csv_writer = csv.writer(stream, lineterminator="\n")
+            self.csv_writer.writerow(self.csv_header())
+
+    def csv_header(self):
+        header = []
+        for field in self.fields:
+            if field == "clip_urls":
+                header.extend("clip_{}_url".format(n) for n in range(1, MAX_CLIPS + 1))
+            else:
+                header.append(field)
+        return header
+
+    def csv_row(self, row):
+        values = []
+        for field in self.fields:
+            if field == "clip_urls":
+                clip_urls = list(row.get("clip_urls") or [])
+                clip_urls.extend([""] * (MAX_CLIPS - len(clip_urls)))
+                values.extend(record_text(url) for url in clip_urls[:MAX_CLIPS])
+            elif isinstance(row.get(field), list):
+                values.append("; ".join(record_text(value) for value in row[field]))
+            else:
+                values.append(record_text(row.get(field)))
+        return values
+
+    def write(self, row):
+        if self.csv_writer is not None:
+            self.csv_writer.writerow(self.csv_row(row))
+        else:
+            self.stream.write(json.dumps(row, sort_keys=True))
+            self.stream.write("\n")
+        self.count += 1
+
+    def flush(self):
+        self.stream.flush()
+
+
+# Records that fail validate_record or won't render are skipped and handed to rejected(record, problems).
+def export_outputs(records, stream, output_format="ndjson", render=render_record, link_validator=None,
+                   rejected=None):
+    if link_validator is None:
+        writer = OutputWriter(stream, output_format)
+    else:
+        writer = OutputWriter(stream, output_format, OUTPUT_FIELDS + ("link_problems",))
+    for record in records:
+        problems = validate_record(record)
+        if problems:
+            if rejected is not None:
+                rejected(record, problems)
+            continue
+        try:
+            row = render(record)
+        except (TypeError, ValueError, AttributeError, IndexError) as error:
+            # Same as serve, one record that won't render shouldn't stop the whole run.
+            if rejected is not None:
+                rejected(record, ["could not render: {}".format(error)])
+            continue
+        if link_validator is not None:
+            row = dict(row, link_problems=link_validator.check_row(row))
+        writer.write(row)
+    writer.flush()
+    return writer.count
+
+
+# Reruns over past episodes mostly feed in exactly what they fed in last time, so rendered
+# rows get stashed on disk under a hash of everything that goes into them: the normalized
+# record, TEMPLATE_VERSION and the render config (the show, its cutoff and the air date).
+# Bump TEMPLATE_VERSION whenever an Episode/Podcast output template changes.
+
+TEMPLATE_VERSION = 3
+APP_DATA_DIR = os.path.join(os.path.expanduser("~"), ".episodetools")
+RENDER_CACHE_DIR = os.path.join(APP_DATA_DIR, "render-cache")
+RENDER_CACHE_MAX_BYTES = 64 << 20
+
+
+def normalize_record(record):
+    normalized = {"episode": [record_text(record.get(field))
+                              for field in ("title", "season", "number", "uuid", "username")],
+                  "clips": [list(clip) for clip in record_clips(record)],
+                  "podcast": None}
+    pod_record = record.get("podcast")
+    if pod_record:
+        normalized["podcast"] = [record_text(pod_record.get(field))
+                                 for field in ("title", "description", "preroll_ads")] + \
+                                [record_adlocations(pod_record)] + \
+                                [record_text(pod_record.get(field)) for field in ("midroll_ads", "postroll_ads")] + \
+                                [record_text(pod_record.get("username", record.get("username")))]
+    return normalized
+
+
+def render_config(record):
+    show = record.get("show") or DEFAULT_SHOW
+    return {"show": record_text(show),
+            "cutoff": air_dates.cutoff(show).strftime("%H:%M"),
+            "date": air_dates.for_record(record)}
+
+
+class RenderCache(object):
+    def __init__(self, directory=RENDER_CACHE_DIR, max_bytes=RENDER_CACHE_MAX_BYTES):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.lock = threading.Lock()
+        # key -> (last used, size); rebuilt from the files once per run.
+        self.entries = {}
+        self.total_bytes = 0
+        if not os.path.isdir(directory):
+            os.makedirs(directory)
+        for name in os.listdir(directory):
+            if name.endswith(".json"):
+                stat = os.stat(os.path.join(directory, name))
+                self.entries[name[:-5]] = (stat.st_mtime, stat.st_size)
+                self.total_bytes += stat.st_size
+
+    @staticmethod
+    def key(record, config=None):
+        if config is None:
+            config = render_config(record)
+        payload = json.dumps([TEMPLATE_VERSION, config, normalize_record(record)], sort_keys=True)
+        return hashlib.sha1(payload).hexdigest()
+
+    def path(self, key):
+        return os.path.join(self.directory, key + ".json")
+
+    def get(self, key):
+        if key not in self.entries:
+            return None
+        try:
+            with open(self.path(key), "rb") as cache_file:
+                row = json.load(cache_file)
+            # Touch it so eviction treats it as recently used.
+            os.utime(self.path(key), None)
+        except (IOError, OSError, ValueError):
+            return None
+        with self.lock:
+            self.entries[key] = (time.time(), self.entries.get(key, (0, 0))[1])
+        return row
+
+    def put(self, key, row):
+        body = json.dumps(row, sort_keys=True)
+        # Write to a temp file and rename it in, so a crash or a second process never
+        # leaves a half written row behind.
+        temp_path = "{}.{}.{}.tmp".format(self.path(key), os.getpid(), threading.current_thread().ident)
+        with open(temp_path, "wb") as cache_file:
+            cache_file.write(body)
+        os.rename(temp_path, self.path(key))
+        with self.lock:
+            self.total_bytes -= self.entries.get(key, (0, 0))[1]
+            self.entries[key] = (time.time(), len(body))
+            self.total_bytes += len(body)
+            if self.total_bytes > self.max_bytes:
+                self.evict()
+
+    # Drops least recently used rows until we're back under 90% of max_bytes, so we
+    # aren't evicting again on the very next put.
+    def evict(self):
+        target = self.max_bytes * 9 // 10
+        for key, (used, size) in sorted(self.entries.items(), key=lambda entry: entry[1][0]):
+            if self.total_bytes <= target:
+                break
+            try:
+                os.remove(self.path(key))
+            except OSError:
+                pass
+            del self.entries[key]
+            self.total_bytes -= size
+            self.evictions += 1
+
+    def render(self, record):
+        key = self.key(record)
+        row = self.get(key)
+        if row is not None:
+            with self.lock:
+                self.hits += 1
+            return row
+        with self.lock:
+            self.misses += 1
+        row = render_record(record)
+        self.put(key, row)
+        return row
+
+    @property
+    def stats(self):
+        return {"hits": self.hits, "misses": self.misses, "evictions": self.evictions,
+                "entries": len(self.entries), "bytes": self.total_bytes}
+
+    def summary(self):
+        return "Render cache: {hits} hits, {misses} misses, {evictions} evictions, " \
+               "{entries} entries ({bytes} bytes)".format(**self.stats)
+
+
+# A small localhost HTTP service so the CMS tooling can get the exact same output as the
+# app. Requests are handed to a fixed number of worker threads instead of one thread per
+# connection, and connections are kept alive so a client can push lots of renders through
+# one socket.
+#
+#   POST /render  {...record...}                    -> {...row...}
+#   POST /render  {"episodes": [{...}, {...}, ...]} -> {"results": [{...row...}, ...]}
+#   GET  /health                                    -> {"status": "ok", "render_cache": {...}}
+
+SERVE_HOST = "127.0.0.1"
+SERVE_PORT = 8765
+# A kept-alive connection holds its worker until its next request, so at most SERVE_WORKERS
+# connections are served at once. An idle one gives its worker back after SERVE_IDLE_TIMEOUT
+# seconds, or within SERVE_IDLE_POLL seconds of another connection queueing up for a worker,
+# and a response sent while anyone is queued closes its connection.
+SERVE_WORKERS = 8
+SERVE_QUEUE_SIZE = 64
+SERVE_IDLE_TIMEOUT = 30
+SERVE_IDLE_POLL = 0.05
+SERVE_MAX_BODY = 16 << 20
+
+
+class RenderRequestHandler(BaseHTTPServer.BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    server_version = "EpisodeTools"
+    # Idle keep-alive connections give their worker back after this many seconds.
+    timeout = SERVE_IDLE_TIMEOUT
+    # Buffer the status line, headers and body into one send, and don't let Nagle sit on it
+    # waiting for the client's delayed ACK. Without these every keep-alive request took ~40ms.
+    wbufsize = -1
+    disable_nagle_algorithm = True
+
+    def handle(self):
+        self.close_connection = 1
+        self.handle_one_request()
+        while not self.close_connection and self.wait_for_request():
+            self.handle_one_request()
+
+    # Waits for the next request on a kept-alive connection, giving up (and the worker with
+    # it) after the idle timeout or as soon as another connection is queued for a worker.
+    def wait_for_request(self):
+        buffered = getattr(self.rfile, "_rbuf", None)
+        if buffered is not None and buffered.tell():
+            # The client already pipelined its next request.
+            return True
+        deadline = time.time() + self.timeout
+        while self.server.pending.empty():
+            remaining = deadline - time.time()
+            if remaining <= 0:
+                return False
+            if select.select([self.connection], [], [], min(remaining, SERVE_IDLE_POLL))[0]:
+                return True
+        return False
+
+    def send_json(self, status, payload):
+        body = json.dumps(payload, sort_keys=True)
+        if not self.server.pending.empty():
+            # Someone's waiting for a worker, so this connection hands its worker over.
+            self.close_connection = 1
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        if self.close_connection:
+            self.send_header("Connection", "close")
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        if self.path == "/health":
+            cache = self.server.render_cache
+            self.send_json(200, {"status": "ok", "render_cache": cache.stats if cache is not None else None})
+        else:
+            self.send_json(404, {"error": "Not found: {}".format(self.path)})
+
+    def do_POST(self):
+        try:
+            length = int(self.headers.getheader("Content-Length") or 0)
+        except ValueError:
+            length = -1
+        # Whatever body we don't read would be parsed as the next request on this connection,
+        # so a body we can't or won't read (chunked, bad length, too big) closes it instead.
+        if self.headers.getheader("Transfer-Encoding") or length < 0 or length > SERVE_MAX_BODY:
+            self.close_connection = 1
+            body = None
+        else:
+            body = self.rfile.read(length)
+        if self.path != "/render":
+            self.send_json(404, {"error": "Not found: {}".format(self.path)})
+            return
+        if body is None:
+            if self.headers.getheader("Transfer-Encoding"):
+                self.send_json(411, {"error": "Send the body with a Content-Length"})
+            else:
+                self.send_json(413 if length > SERVE_MAX_BODY else 400, {"error": "Bad Content-Length"})
+            return
+        try:
+            payload = json.loads(body)
+        except ValueError as error:
+            self.send_json(400, {"error": "Invalid JSON: {}".format(error)})
+            return
+
+        if isinstance(payload, dict) and "episodes" in payload:
+            if not isinstance(payload["episodes"], list):
+                self.send_json(400, {"error": "\"episodes\" must be a list of episode records"})
+                return
+            self.send_json(200, {"results": [self.render(record) for record in payload["episodes"]]})
+        elif isinstance(payload, list):
+            self.send_json(200, {"results": [self.render(record) for record in payload]})
+        else:
+            row = self.render(payload)
+            self.send_json(400 if "error" in row else 200, row)
+
+    # One bad record in a batch shouldn't throw away the rest, so errors go in its slot.
+    def render(self, record):
+        try:
+            problems = validate_record(record)
+            if problems:
+                return {"error": "Invalid episode record", "problems": problems}
+            if self.server.render_cache is not None:
+                return self.server.render_cache.render(record)
+            return render_record(record)
+        except (TypeError, ValueError, AttributeError, IndexError) as error:
+            return {"error": "Could not render episode: {}".format(error)}
+
+    def log_message(self, *args):
+        if self.server.verbose:
+            BaseHTTPServer.BaseHTTPRequestHandler.log_message(self, *args)
+
+
+class RenderServer(BaseHTTPServer.HTTPServer):
+    def __init__(self, address, workers=SERVE_WORKERS, verbose=False, render_cache=None):
+        BaseHTTPServer.HTTPServer.__init__(self, address, RenderRequestHandler)
+        self.verbose = verbose
+        self.render_cache = render_cache
+        # When every worker is busy and the queue is full, accept() just waits, so the
+        # backlog ends up in the kernel instead of in piles of threads.
+        self.pending = Queue.Queue(SERVE_QUEUE_SIZE)
+        self.workers = [threading.Thread(target=self.worker, name="render-worker-{}".format(n))
+                        for n in range(workers)]
+        for worker in self.workers:
+            worker.daemon = True
+            worker.start()
+
+    def process_request(self, request, client_address):
+        self.pending.put((request, client_address))
+
+    def worker(self):
+        while True:
+            request, client_address = self.pending.get()
+            if request is None:
+                break
+            try:
+                self.finish_request(request, client_address)
+            except Exception:
+                self.handle_error(request, client_address)
+            finally:
+                self.shutdown_request(request)
+
+    def server_close(self):
+        BaseHTTPServer.HTTPServer.server_close(self)
+        for _ in self.workers:
+            self.pending.put((None, None))
+        for worker in self.workers:
+            worker.join(SERVE_IDLE_TIMEOUT)
+
+
+def percentile(sorted_values, fraction):
+    if not sorted_values:
+        return 0.0
+    index = int(round(fraction * (len(sorted_values) - 1)))
+    return sorted_values[index]
+
+
+# Hammers a running render service from a handful of keep-alive connections and reports
+# how long each request took.
+def load_test(host, port, body, clients=4, requests_per_client=250):
+    latencies = []
+    errors = []
+    latencies_lock = threading.Lock()
+
+    def client():
+        connection = httplib.HTTPConnection(host, port, timeout=SERVE_IDLE_TIMEOUT)
+        timings = []
+
+        def send():
+            connection.request("POST", "/render", body, {"Content-Type": "application/json"})
+            response = connection.getresponse()
+            response.read()
+            return response
+
+        try:
+            for _ in range(requests_per_client):
+                started = time.time()
+                try:
+                    response = send()
+                except (socket.error, httplib.HTTPException):
+                    # The service drops idle kept-alive connections when others are waiting,
+                    # so like any pooled client we reconnect once and try again.
+                    connection.close()
+                    response = send()
+                timings.append(time.time() - started)
+                if response.status != 200:
+                    errors.append(response.status)
+        except (socket.error, httplib.HTTPException) as error:
+            errors.append(str(error))
+        finally:
+            connection.close()
+        with latencies_lock:
+            latencies.extend(timings)
+
+    threads = [threading.Thread(target=client) for _ in range(clients)]
+    started = time.time()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.time() - started
+    latencies.sort()
+    return {"requests": len(latencies),
+            "errors": len(errors),
+            "seconds": elapsed,
+            "requests_per_second": len(latencies) / elapsed if elapsed else 0.0,
+            "p50_ms": percentile(latencies, 0.50) * 1000,
+            "p99_ms": percentile(latencies, 0.99) * 1000}
+
+
+# Producers used to paste every UUID by hand from the CMS. Instead we stream the CMS export
+# (CSV, NDJSON or one big JSON array) into a SQLite index next to the render cache, and look
+# UUIDs up by season/number and clip title as they're typed. The index remembers the size and
+# mtime of the export it was built from and only gets rebuilt when those change.
+#
+# Any row with a clip title is a clip, anything else is an episode. Column names vary between
+# CMS exports, so each field accepts a few aliases.
+
+CMS_INDEX_DIR = os.path.join(APP_DATA_DIR, "cms-index")
+CMS_INDEX_VERSION = 1
+CMS_BATCH_SIZE = 5000
+CMS_READ_SIZE = 1 << 16
+CMS_FIELD_ALIASES = {"season": ("season", "season_number"),
+                     "number": ("number", "episode_number", "episode_airing_order", "airing_order"),
+                     "uuid": ("uuid", "episode_uuid", "ep_uuid"),
+                     "clip_title": ("clip_title",),
+                     "clip_uuid": ("clip_uuid",)}
+
+
+def cms_field(row, field):
+    for alias in CMS_FIELD_ALIASES[field]:
+        value = row.get(alias)
+        if value not in (None, ""):
+            return record_text(value).strip()
+    return ""
+
+
+# "024" and "24" are the same season.
+def cms_number_key(value):
+    return record_text(value).strip().lstrip("0") or "0"
+
+
+def cms_title_key(value):
+    return " ".join(record_text(value).lower().split())
+
+
+# Pulls objects out of a JSON array (or NDJSON) a chunk at a time, so a few hundred thousand
+# rows never have to be parsed into one giant list.
+def iter_json_objects(stream):
+    decoder = json.JSONDecoder()
+    buffered = ""
+    in_array = None
+    while True:
+        chunk = stream.read(CMS_READ_SIZE)
+        buffered += chunk
+        position = 0
+        while True:
+            while position < len(buffered) and buffered[position] in " \t\r\n,":
+                position += 1
+            if position < len(buffered) and in_array is None:
+                in_array = buffered[position] == "["
+                if in_array:
+                    position += 1
+                continue
+            if position >= len(buffered) or buffered[position] == "]":
+                break
+            try:
+                item, position = decoder.raw_decode(buffered, position)
+            except ValueError:
+                # Only half an object so far, wait for the next chunk.
+                if not chunk:
+                    raise
+                break
+            yield item
+        buffered = buffered[position:]
+        if not chunk:
+            break
+
+
+def iter_cms_rows(path):
+    with open(path, "rb", CMS_READ_SIZE) as export_file:
+        # Excel and friends start their UTF-8 exports with a BOM, which would otherwise end up
+        # stuck to the first column name.
+        if export_file.read(len(codecs.BOM_UTF8)) != codecs.BOM_UTF8:
+            export_file.seek(0)
+        if path.lower().endswith(".csv"):
+            for row in csv.DictReader(export_file):
+                yield row
+        else:
+            for row in iter_json_objects(export_file):
+                yield row
+
+
+class CMSIndex(object):
+    def __init__(self, export_path, index_path=None):
+        self.export_path = os.path.abspath(export_path)
+        if index_path is None:
+            index_path = os.path.join(CMS_INDEX_DIR, hashlib.sha1(record_text(self.export_path)).hexdigest() + ".sqlite")
+        self.index_path = index_path
+        self.rebuilt = False
+        if not self.up_to_date():
+            self.rebuild()
+        # The app builds the index off the Tk thread and then reads it from the Tk thread.
+        self.connection = sqlite3.connect(self.index_path, check_same_thread=False)
+
+    def source_signature(self):
+        stat = os.stat(self.export_path)
+        return "{}:{}:{}".format(CMS_INDEX_VERSION, stat.st_size, stat.st_mtime)
+
+    def up_to_date(self):
+        if not os.path.exists(self.index_path):
+            return False
+        connection = sqlite3.connect(self.index_path)
+        try:
+            signature = connection.execute("SELECT value FROM meta WHERE key = 'source'").fetchone()
+        except sqlite3.DatabaseError:
+            return False
+        finally:
+            connection.close()
+        return signature is not None and signature[0] == self.source_signature()
+
+    # Builds into a temp file and renames it over the old index, so a half built index is
+    # never what the app opens.
+    def rebuild(self):
+        directory = os.path.dirname(self.index_path)
+        if directory and not os.path.isdir(directory):
+            os.makedirs(directory)
+        signature = self.source_signature()
+        temp_path = "{}.{}.tmp".format(self.index_path, os.getpid())
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        connection = sqlite3.connect(temp_path)
+        try:
+            connection.execute("PRAGMA journal_mode = OFF")
+            connection.execute("PRAGMA synchronous = OFF")
+            connection.execute("CREATE TABLE meta (key TEXT PRIMARY KEY, value TEXT)")
+            connection.execute("CREATE TABLE episodes (season TEXT, number TEXT, uuid TEXT, "
+                               "PRIMARY KEY (season, number))")
+            connection.execute("CREATE TABLE clips (season TEXT, number TEXT, title TEXT, uuid TEXT, "
+                               "PRIMARY KEY (season, number, title))")
+            episodes = []
+            clips = []
+            for row in iter_cms_rows(self.export_path):
+                if not isinstance(row, dict):
+                    continue
+                season = cms_number_key(cms_field(row, "season"))
+                number = cms_number_key(cms_field(row, "number"))
+                clip_title = cms_field(row, "clip_title")
+                if clip_title:
+                    uuid = cms_field(row, "clip_uuid") or cms_field(row, "uuid")
+                    if uuid:
+                        clips.append((season, number, cms_title_key(clip_title), uuid))
+                else:
+                    uuid = cms_field(row, "uuid")
+                    if uuid:
+                        episodes.append((season, number, uuid))
+                if len(episodes) + len(clips) >= CMS_BATCH_SIZE:
+                    self.insert(connection, episodes, clips)
+                    episodes, clips = [], []
+            self.insert(connection, episodes, clips)
+            connection.execute("INSERT INTO meta VALUES ('source', ?)", (signature,))
+            connection.commit()
+        finally:
+            connection.close()
+        os.rename(temp_path, self.index_path)
+        self.rebuilt = True
+
+    @staticmethod
+    def insert(connection, episodes, clips):
+        # Later rows win, which is what you want when the CMS re-exports an updated item.
+        connection.executemany("INSERT OR REPLACE INTO episodes VALUES (?, ?, ?)",
+                               [tuple(value.decode("utf-8") for value in row) for row in episodes])
+        connection.executemany("INSERT OR REPLACE INTO clips VALUES (?, ?, ?, ?)",
+                               [tuple(value.decode("utf-8") for value in row) for row in clips])
+
+    def episode_uuid(self, season, number):
+        row = self.connection.execute("SELECT uuid FROM episodes WHERE season = ? AND number = ?",
+                                      (cms_number_key(season).decode("utf-8"),
+                                       cms_number_key(number).decode("utf-8"))).fetchone()
+        return row[0] if row is not None else None
+
+    def clip_uuid(self, season, number, title):
+        row = self.connection.execute("SELECT uuid FROM clips WHERE season = ? AND number = ? AND title = ?",
+                                      (cms_number_key(season).decode("utf-8"),
+                                       cms_number_key(number).decode("utf-8"),
+                                       cms_title_key(title).decode("utf-8"))).fetchone()
+        return row[0] if row is not None else None
+
+    @property
+    def counts(self):
+        return (self.connection.execute("SELECT COUNT(*) FROM episodes").fetchone()[0],
+                self.connection.execute("SELECT COUNT(*) FROM clips").fetchone()[0])
+
+    def close(self):
+        self.connection.close()
+
+
+# A typo in a UUID or title only used to get noticed once the site email was out. This checks
+# generated URLs against a local sitemap dump (XML or a plain list of URLs/paths). The dump is
+# memory-mapped and scanned with one regex, and all we keep per known page is its UUID and a
+# CRC of its path, which is plenty to tell "no such UUID" from "right UUID, wrong slug".
+
+LINK_SECTIONS = ("full-episodes", "episode-clips")
+LINK_PATTERN = re.compile(r'https?://[^/\s<>"\']+(/[^\s<>"\']*)|^(/[^\s<>"\']*)', re.MULTILINE)
+
+
+def link_path(url):
+    match = LINK_PATTERN.match(url)
+    path = (match.group(1) or match.group(2)) if match else url
+    return path.rstrip("/")
+
+
+# Site paths look like /full-episodes/<uuid>/<slug> and /episode-clips/<uuid>/<slug>.
+def link_uuid(path):
+    parts = path.split("/")
+    return parts[2] if len(parts) > 3 and parts[1] in LINK_SECTIONS else None
+
+
+class LinkValidator(object):
+    def __init__(self, sitemap_path):
+        self.sitemap_path = sitemap_path
+        self.paths = {}
+        self.checked = 0
+        self.problems = 0
+        with open(sitemap_path, "rb") as sitemap_file:
+            if os.fstat(sitemap_file.fileno()).st_size == 0:
+                return
+            sitemap = mmap.mmap(sitemap_file.fileno(), 0, access=mmap.ACCESS_READ)
+            try:
+                for match in LINK_PATTERN.finditer(sitemap):
+                    path = (match.group(1) or match.group(2)).rstrip("/")
+                    uuid = link_uuid(path)
+                    if uuid is not None:
+                        self.paths[uuid] = zlib.crc32(path)
+            finally:
+                sitemap.close()
+
+    def __len__(self):
+        return len(self.paths)
+
+    # Returns None for a known page, otherwise what's wrong with it.
+    def check(self, url):
+        self.checked += 1
+        path = link_path(record_text(url))
+        uuid = link_uuid(path)
+        if uuid is None:
+            problem = "not a page URL"
+        elif uuid not in self.paths:
+            problem = "unknown UUID"
+        elif self.paths[uuid] != zlib.crc32(path):
+            problem = "slug mismatch"
+        else:
+            return None
+        self.problems += 1
+        return problem
+
+    def check_row(self, row):
+        problems = []
+        urls = [("Episode", row.get("url"))]
+        urls.extend(("Clip {}".format(n), url) for n, url in enumerate(row.get("clip_urls") or [], 1))
+        for name, url in urls:
+            if url:
+                problem = self.check(url)
+                if problem is not None:
+                    problems.append("{}: {}".format(name, problem))
+        return problems
+
+    def summary(self):
+        return "Links: {} checked against {} known pages, {} problem(s)".format(
+            self.checked, len(self.paths), self.problems)
+
+
+# Watcher mode for the ingest drop folder. Every *.json file in the folder is one episode
+# record (same format as the export command, podcast included), and its rendered row is
+# written next to it as <name>.rendered.json.
+#
+# Checking the folder is one stat() on the directory itself. Its mtime moves whenever a file
+# is added, removed or renamed in, which is how the ingest system delivers, so the listing and
+# the per-file stat() calls only happen when it does. Every WATCH_RESCAN_INTERVAL seconds we
+# stat every file anyway to catch anything that got rewritten in place. A file is only
+# rendered again when its mtime or size changes.
+
+WATCH_SUFFIX = ".json"
+WATCH_OUTPUT_SUFFIX = ".rendered.json"
+WATCH_POLL_INTERVAL = 1.0
+WATCH_RESCAN_INTERVAL = 60.0
+# Filesystems like HFS+ only keep mtimes to the second, so a directory touched this recently
+# might change again without its mtime moving. We keep listing it until it settles.
+WATCH_SETTLE_SECONDS = 2.0
+
+
+class FolderWatcher(object):
+    def __init__(self, directory, render=render_record, link_validator=None,
+                 rescan_interval=WATCH_RESCAN_INTERVAL, log=None):
+        self.directory = directory
+        self.render = render
+        self.link_validator = link_validator
+        self.rescan_interval = rescan_interval
+        self.log = log if log is not None else (lambda message: None)
+        # name -> (mtime, size) as of the last time we rendered (or failed to render) it.
+        self.seen = {}
+        self.retry = set()
+        self.directory_mtime = None
+        self.last_rescan = 0
+        self.rendered = 0
+        self.failed = 0
+
+    @staticmethod
+    def is_input(name):
+        return name.endswith(WATCH_SUFFIX) and not name.endswith(WATCH_OUTPUT_SUFFIX) and not name.startswith(".")
+
+    def output_path(self, name):
+        return os.path.join(self.directory, name[:-len(WATCH_SUFFIX)] + WATCH_OUTPUT_SUFFIX)
+
+    # Looks for new and changed files once, renders them, and returns how many it rendered.
+    def poll(self):
+        now = time.time()
+        directory_mtime = os.stat(self.directory).st_mtime
+        if directory_mtime != self.directory_mtime or now - directory_mtime < WATCH_SETTLE_SECONDS:
+            names = set(name for name in os.listdir(self.directory) if self.is_input(name))
+            for name in set(self.seen) - names:
+                del self.seen[name]
+                self.retry.discard(name)
+            self.directory_mtime = directory_mtime
+            self.last_rescan = now
+            candidates = names
+        elif now - self.last_rescan >= self.rescan_interval:
+            self.last_rescan = now
+            candidates = list(self.seen)
+        else:
+            # Files that failed last time (usually still being written) get another look.
+            candidates = list(self.retry)
+
+        rendered = 0
+        for name in candidates:
+            path = os.path.join(self.directory, name)
+            try:
+                stat = os.stat(path)
+            except OSError:
+                self.seen.pop(name, None)
+                self.retry.discard(name)
+                continue
+            signature = (stat.st_mtime, stat.st_size)
+            if self.seen.get(name) == signature:
+                continue
+            if name not in self.seen and self.output_is_current(name, stat.st_mtime):
+                # Already rendered by an earlier run of the watcher.
+                self.seen[name] = signature
+                continue
+            self.seen[name] = signature
+            if self.process(name):
+                self.retry.discard(name)
+                rendered += 1
+            else:
+                self.retry.add(name)
+        return rendered
+
+    def output_is_current(self, name, mtime):
+        try:
+            return os.stat(self.output_path(name)).st_mtime >= mtime
+        except OSError:
+            return False
+
+    def process(self, name):
+        path = os.path.join(self.directory, name)
+        try:
+            with open(path, "rb") as record_file:
+                record = json.load(record_file)
+            problems = validate_record(record)
+            if problems:
+                raise ValueError("; ".join(problems))
+            row = self.render(record)
+        except (IOError, OSError, ValueError, TypeError, AttributeError, IndexError) as error:
+            self.failed += 1
+            self.log("Couldn't render {}: {}".format(name, error))
+            return False
+        if self.link_validator is not None:
+            row = dict(row, link_problems=self.link_validator.check_row(row))
+        output_path = self.output_path(name)
+        temp_path = "{}.{}.tmp".format(output_path, os.getpid())
+        with open(temp_path, "wb") as output_file:
+            json.dump(row, output_file, sort_keys=True, indent=2)
+        os.rename(temp_path, output_path)
+        self.rendered += 1
+        self.log("Rendered {}".format(name))
+        return True
+
+    def watch(self, interval=WATCH_POLL_INTERVAL):
+        while True:
+            self.poll()
+            time.sleep(interval)
+
+
+# Episode archives (*.epa) for season-scale reports and reruns. Instead of one JSON object
+# per episode, every field is stored as its own column of fixed-width little-endian values,
+# one row per episode (or per clip), and all the text goes in a single string heap at the
+# end, pointed at by (offset, length) pairs. The file is memory-mapped and values are read
+# straight out of the map with struct.unpack_from, so scanning a column never builds the
+# records, and slicing a year out of ten only touches the pages for that year.
+#
+# Layout:
+#   header     magic, version, column count, episode count, clip count
+#   directory  one entry per column: name, type, row count, file offset
+#   columns    "I" columns are uint32 per row, "S" columns are (heap offset, length) uint32 pairs
+#   heap       the UTF-8 text, each distinct short string stored once
+#
+# Columns are 8 byte aligned and looked up by name, so adding one later doesn't break old readers.
+
+ARCHIVE_SUFFIX = ".epa"
+ARCHIVE_MAGIC = "EPARCHIV"
+ARCHIVE_VERSION = 1
+ARCHIVE_HEADER = struct.Struct("<8sIIII")
+ARCHIVE_COLUMN = struct.Struct("<24scxxxIQ")
+ARCHIVE_INT = struct.Struct("<I")
+ARCHIVE_STRING = struct.Struct("<II")
+ARCHIVE_TYPE_SIZES = {"I": ARCHIVE_INT.size, "S": ARCHIVE_STRING.size}
+# Columns with a handful of distinct values across the whole archive, which are only stored in
+# the heap once each. Titles and UUIDs are (nearly) all different, so they're never looked up.
+ARCHIVE_INTERNED_COLUMNS = frozenset(("username", "show", "date", "pod_preroll_ads", "pod_midroll_ads",
+                                      "pod_postroll_ads", "pod_username"))
+
+# (column, record field) for every episode text column.
+ARCHIVE_EPISODE_STRINGS = (("title", "title"), ("season", "season"), ("number", "number"), ("uuid", "uuid"),
+                           ("username", "username"), ("show", "show"), ("date", "date"))
+ARCHIVE_PODCAST_STRINGS = (("pod_title", "title"), ("pod_description", "description"),
+                           ("pod_preroll_ads", "preroll_ads"), ("pod_adlocations", "adlocations"),
+                           ("pod_midroll_ads", "midroll_ads"), ("pod_postroll_ads", "postroll_ads"),
+                           ("pod_username", "username"))
+ARCHIVE_CLIP_STRINGS = (("clip_title", "title"), ("clip_description", "description"), ("clip_uuid", "uuid"))
+# season_n/number_n/date_ordinal are the numeric versions of season/number/date, for scanning.
+ARCHIVE_EPISODE_INTS = ("season_n", "number_n", "date_ordinal", "has_podcast", "clip_start", "clip_count")
+ARCHIVE_CLIP_INTS = ("clip_episode",)
+# (column, type) for everything a reader needs, newer archives can have more.
+ARCHIVE_REQUIRED_COLUMNS = ([(name, "I") for name in ARCHIVE_EPISODE_INTS + ARCHIVE_CLIP_INTS] +
+                            [(name, "S") for name, field in
+                             ARCHIVE_EPISODE_STRINGS + ARCHIVE_PODCAST_STRINGS + ARCHIVE_CLIP_STRINGS] +
+                            [("heap", "H")])
+
+
+def archive_int(value):
+    value = record_text(value).strip()
+    return int(value) if value.isdigit() else 0
+
+
+def archive_ordinal(air_date):
+    if not air_date:
+        return 0
+    return AirDates.parse(air_date, DATE_INPUT_FORMATS).toordinal()
+
+
+class ArchiveWriter(object):
+    def __init__(self):
+        self.columns = {}
+        for name in ARCHIVE_EPISODE_INTS + ARCHIVE_CLIP_INTS:
+            self.columns[name] = array.array("I")
+        for name, field in ARCHIVE_EPISODE_STRINGS + ARCHIVE_PODCAST_STRINGS + ARCHIVE_CLIP_STRINGS:
+            # Offset and length, one after the other.
+            self.columns[name] = array.array("I")
+        self.heap = tempfile.TemporaryFile()
+        self.heap_size = 0
+        self.interned = {}
+        self.episodes = 0
+        self.clips = 0
+
+    def add_string(self, name, value):
+        value = record_text(value)
+        interned = name in ARCHIVE_INTERNED_COLUMNS
+        location = self.interned.get(value) if interned else None
+        if location is None:
+            location = (self.heap_size, len(value))
+            self.heap.write(value)
+            self.heap_size += len(value)
+            if interned:
+                self.interned[value] = location
+        self.columns[name].extend(location)
+
+    # Records should already have their dates resolved (air_dates.resolve), otherwise
+    # they'd all be archived as airing today.
+    def add(self, record):
+        air_date = air_dates.for_record(record)
+        record = dict(record, date=air_date, show=record.get("show") or DEFAULT_SHOW)
+        for name, field in ARCHIVE_EPISODE_STRINGS:
+            self.add_string(name, record.get(field))
+        pod_record = record.get("podcast") or {}
+        pod_record = dict(pod_record, adlocations=", ".join(record_adlocations(pod_record)) if pod_record else "")
+        for name, field in ARCHIVE_PODCAST_STRINGS:
+            self.add_string(name, pod_record.get(field))
+        clips = record_clips(record)
+        self.columns["season_n"].append(archive_int(record.get("season")))
+        self.columns["number_n"].append(archive_int(record.get("number")))
+        self.columns["date_ordinal"].append(archive_ordinal(air_date))
+        self.columns["has_podcast"].append(1 if record.get("podcast") else 0)
+        self.columns["clip_start"].append(self.clips)
+        self.columns["clip_count"].append(len(clips))
+        for clip in clips:
+            self.columns["clip_episode"].append(self.episodes)
+            for (name, field), value in zip(ARCHIVE_CLIP_STRINGS, clip):
+                self.add_string(name, value)
+            self.clips += 1
+        self.episodes += 1
+
+    def column_entries(self):
+        entries = []
+        for name in ARCHIVE_EPISODE_INTS:
+            entries.append((name, "I", self.episodes))
+        for name, field in ARCHIVE_EPISODE_STRINGS + ARCHIVE_PODCAST_STRINGS:
+            entries.append((name, "S", self.episodes))
+        for name in ARCHIVE_CLIP_INTS:
+            entries.append((name, "I", self.clips))
+        for name, field in ARCHIVE_CLIP_STRINGS:
+            entries.append((name, "S", self.clips))
+        entries.append(("heap", "H", self.heap_size))
+        return entries
+
+    # Written to a temp file and renamed in, so a reader never maps half an archive.
+    def save(self, path):
+        entries = self.column_entries()
+        offset = ARCHIVE_HEADER.size + ARCHIVE_COLUMN.size * len(entries)
+        directory = []
+        for name, column_type, rows in entries:
+            offset = (offset + 7) & ~7
+            directory.append((name, column_type, rows, offset))
+            offset += rows * ARCHIVE_TYPE_SIZES.get(column_type, 1)
+        temp_path = "{}.{}.tmp".format(path, os.getpid())
+        with open(temp_path, "wb", EXPORT_BUFFER_SIZE) as archive_file:
+            archive_file.write(ARCHIVE_HEADER.pack(ARCHIVE_MAGIC, ARCHIVE_VERSION, len(directory),
+                                                   self.episodes, self.clips))
+            for entry in directory:
+                archive_file.write(ARCHIVE_COLUMN.pack(*entry))
+            for name, column_type, rows, offset in directory:
+                archive_file.write("\0" * (offset - archive_file.tell()))
+                if column_type == "H":
+                    self.heap.seek(0)
+                    shutil.copyfileobj(self.heap, archive_file, EXPORT_BUFFER_SIZE)
+                else:
+                    values = self.columns[name]
+                    if sys.byteorder != "little":
+                        values = array.array("I", values)
+                        values.byteswap()
+                    values.tofile(archive_file)
+        os.rename(temp_path, path)
+        self.heap.close()
+
+
+def write_archive(records, path, rejected=None):
+    writer = ArchiveWriter()
+    for record in records:
+        problems = validate_record(record)
+        if problems:
+            if rejected is not None:
+                rejected(record, problems)
+            continue
+        writer.add(record)
+    writer.save(path)
+    return writer.episodes, writer.clips
+
+
+class EpisodeArchive(object):
+    def __init__(self, path):
+        self.path = path
+        self.archive_file = open(path, "rb")
+        size = os.fstat(self.archive_file.fileno()).st_size
+        if size < ARCHIVE_HEADER.size:
+            self.archive_file.close()
+            raise ValueError("Not an episode archive: {}".format(path))
+        self.map = mmap.mmap(self.archive_file.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, column_count, self.episodes, self.clips = ARCHIVE_HEADER.unpack_from(self.map, 0)
+        if magic != ARCHIVE_MAGIC or version > ARCHIVE_VERSION:
+            self.close()
+            raise ValueError("Not an episode archive (or a newer one): {}".format(path))
+        if ARCHIVE_HEADER.size + column_count * ARCHIVE_COLUMN.size > size:
+            self.close()
+            raise ValueError("Truncated episode archive: {}".format(path))
+        # name -> (type, row count, offset)
+        self.directory = {}
+        for n in range(column_count):
+            name, column_type, rows, offset = ARCHIVE_COLUMN.unpack_from(
+                self.map, ARCHIVE_HEADER.size + n * ARCHIVE_COLUMN.size)
+            if offset + rows * ARCHIVE_TYPE_SIZES.get(column_type, 1) > size:
+                self.close()
+                raise ValueError("Truncated episode archive: {}".format(path))
+            self.directory[name.rstrip("\0")] = (column_type, rows, offset)
+        missing = [name for name, column_type in ARCHIVE_REQUIRED_COLUMNS
+                   if self.directory.get(name, (None,))[0] != column_type]
+        if missing:
+            self.close()
+            raise ValueError("Damaged episode archive {}, missing {}".format(path, ", ".join(missing)))
+        self.heap = self.directory["heap"][2]
+        # (record field, column offset) for each group of text columns that make up a record.
+        self.episode_strings = self.string_columns(ARCHIVE_EPISODE_STRINGS)
+        self.podcast_strings = self.string_columns(ARCHIVE_PODCAST_STRINGS)
+        self.clip_strings = self.string_columns(ARCHIVE_CLIP_STRINGS)
+
+    def string_columns(self, columns):
+        return [(field, self.directory[name][2]) for name, field in columns]
+
+    def strings(self, columns, row):
+        unpack_from, archive_map, heap = ARCHIVE_STRING.unpack_from, self.map, self.heap
+        values = {}
+        for field, offset in columns:
+            start, length = unpack_from(archive_map, offset + row * ARCHIVE_STRING.size)
+            values[field] = archive_map[heap + start:heap + start + length]
+        return values
+
+    def __len__(self):
+        return self.episodes
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def close(self):
+        self.map.close()
+        self.archive_file.close()
+
+    def value(self, name, row):
+        column_type, rows, offset = self.directory[name]
+        if column_type == "I":
+            return ARCHIVE_INT.unpack_from(self.map, offset + row * ARCHIVE_INT.size)[0]
+        start, length = ARCHIVE_STRING.unpack_from(self.map, offset + row * ARCHIVE_STRING.size)
+        return self.map[self.heap + start:self.heap + start + length]
+
+    # Scans one column for rows start..stop without touching any of the others.
+    def column(self, name, start=0, stop=None):
+        column_type, rows, offset = self.directory[name]
+        stop = rows if stop is None else min(stop, rows)
+        if column_type == "I":
+            unpack_from, size = ARCHIVE_INT.unpack_from, ARCHIVE_INT.size
+            for row in xrange(start, stop):
+                yield unpack_from(self.map, offset + row * size)[0]
+        else:
+            unpack_from, size, heap, archive_map = ARCHIVE_STRING.unpack_from, ARCHIVE_STRING.size, self.heap, self.map
+            for row in xrange(start, stop):
+                string_start, length = unpack_from(archive_map, offset + row * size)
+                yield archive_map[heap + string_start:heap + string_start + length]
+
+    # Rows whose season and air date fall inside the given bounds (dates as datetime.date).
+    def select(self, season=None, date_from=None, date_to=None):
+        seasons = self.column("season_n") if season is not None else itertools.repeat(None)
+        if date_from is None and date_to is None:
+            ordinals = itertools.repeat(0)
+        else:
+            ordinals = self.column("date_ordinal")
+        low = date_from.toordinal() if date_from is not None else 0
+        high = date_to.toordinal() if date_to is not None else sys.maxint
+        for row, row_season, ordinal in itertools.izip(xrange(self.episodes), seasons, ordinals):
+            if row_season == season and low <= ordinal <= high:
+                yield row
+
+    # The row as the same record dict export and serve take in.
+    def record(self, row):
+        if not 0 <= row < self.episodes:
+            raise IndexError("archive row out of range")
+        record = self.strings(self.episode_strings, row)
+        clip_start = self.value("clip_start", row)
+        record["clips"] = [self.strings(self.clip_strings, clip_row)
+                           for clip_row in xrange(clip_start, clip_start + self.value("clip_count", row))]
+        if self.value("has_podcast", row):
+            pod_record = self.strings(self.podcast_strings, row)
+            if not pod_record["username"]:
+                del pod_record["username"]
+            record["podcast"] = pod_record
+        return record
+
+    def records(self, rows=None):
+        for row in (xrange(self.episodes) if rows is None else rows):
+            yield self.record(row)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return self.records(xrange(*index.indices(self.episodes)))
+        if index < 0:
+            index += self.episodes
+        return self.record(index)
+
+    # Episodes and clips per season, straight off the numeric columns.
+    def season_report(self):
+        report = {}
+        for season, clip_count in itertools.izip(self.column("season_n"), self.column("clip_count")):
+            episodes, clips = report.get(season, (0, 0))
+            report[season] = (episodes + 1, clips + clip_count)
+        return report
+
+
+def is_archive(path):
+    return path.endswith(ARCHIVE_SUFFIX)
+
+
+# For the commands: the opened archive, or None after saying what's wrong with it.
+def open_archive(path):
+    if not os.path.isfile(path):
+        sys.stderr.write("No such file: {}\n".format(path))
+        return None
+    try:
+        return EpisodeArchive(path)
+    except ValueError as error:
+        sys.stderr.write("{}\n".format(error))
+        return None
+
+
+# For the loader benchmark: the same records as one flat CSV row per episode, the way
+# they'd come out of a spreadsheet.
+ARCHIVE_CSV_FIELDS = ([field for name, field in ARCHIVE_EPISODE_STRINGS] +
+                      [name for name, field in ARCHIVE_PODCAST_STRINGS] +
+                      ["clip_{}_{}".format(n, field) for n in range(1, MAX_CLIPS + 1)
+                       for name, field in ARCHIVE_CLIP_STRINGS])
+
+
+def archive_csv_row(record):
+    row = dict((field, record.get(field, "")) for name, field in ARCHIVE_EPISODE_STRINGS)
+    for name, field in ARCHIVE_PODCAST_STRINGS:
+        row[name] = (record.get("podcast") or {}).get(field, "")
+    for n, clip in enumerate(record["clips"], 1):
+        for name, field in ARCHIVE_CLIP_STRINGS:
+            row["clip_{}_{}".format(n, field)] = clip[field]
+    return row
+
+
+def csv_record(row):
+    record = dict((field, row[field]) for name, field in ARCHIVE_EPISODE_STRINGS)
+    record["clips"] = []
+    for n in range(1, MAX_CLIPS + 1):
+        if row["clip_{}_uuid".format(n)]:
+            record["clips"].append(dict((field, row["clip_{}_{}".format(n, field)])
+                                        for name, field in ARCHIVE_CLIP_STRINGS))
+    if row["pod_title"]:
+        record["podcast"] = dict((field, row[name]) for name, field in ARCHIVE_PODCAST_STRINGS)
+    return record
+
+
+def timed(function, repeat):
+    best = None
+    for n in range(repeat):
+        started = time.time()
+        result = function()
+        elapsed = time.time() - started
+        best = elapsed if best is None else min(best, elapsed)
+    return best, result
+
+
+# Times the ways of getting at an archive's episodes against parsing the same data as CSV.
+# Each one is run a few times and the best time is kept, so it's the parsing being measured
+# and not the disk.
+def benchmark_archive(path, csv_path, repeat=3):
+    with EpisodeArchive(path) as archive:
+        with open(csv_path, "wb", EXPORT_BUFFER_SIZE) as csv_file:
+            writer = csv.DictWriter(csv_file, ARCHIVE_CSV_FIELDS, lineterminator="\n")
+            writer.writeheader()
+            for record in archive.records():
+                writer.writerow(archive_csv_row(record))
+
+    def csv_records():
+        with open(csv_path, "rb", EXPORT_BUFFER_SIZE) as csv_file:
+            return sum(1 for row in csv.DictReader(csv_file) if csv_record(row))
+
+    def csv_report():
+        report = {}
+        with open(csv_path, "rb", EXPORT_BUFFER_SIZE) as csv_file:
+            for row in csv.DictReader(csv_file):
+                report[row["season"]] = report.get(row["season"], 0) + 1
+        return len(report)
+
+    def archive_records():
+        with EpisodeArchive(path) as archive:
+            return sum(1 for record in archive.records())
+
+    def archive_report():
+        with EpisodeArchive(path) as archive:
+            return len(archive.season_report())
+
+    def archive_open():
+        with EpisodeArchive(path) as archive:
+            return len(archive)
+
+    return [("CSV, every record", timed(csv_records, repeat)),
+            ("Archive, every record", timed(archive_records, repeat)),
+            ("CSV, episodes per season", timed(csv_report, repeat)),
+            ("Archive, episodes per season", timed(archive_report, repeat)),
+            ("Archive, open only", timed(archive_open, repeat))]
+
+
+# One episode/podcast form with its own Episode and Podcast, shown as a tab in EpisodeApp.
+# Everything that isn't specific to one episode (username, CMS index, sitemap, the slug
+# cache) lives on the app and is shared by every tab.
+class EpisodeWorkspace(BaseFrame):
+    def __init__(self, app, window, *args, **kwargs):
+        BaseFrame.__init__(self, window, *args, **kwargs)
+        self.app = app
+        self.dirty = True
+        self.title_changed = False
+        self.input_frame_left = FullFrame(self)
+        self.input_frame_left.pack_configure(padx=(0, 5), side=tk.LEFT)
+        self.input_frame_right = FullFrame(self)
+        self.input_frame_right.pack_configure(padx=(5, 0), side=tk.LEFT)
+        self.results_frame = FullFrame(self)
+        self.results_frame.pack_configure(padx=10, side=tk.RIGHT)
         self.ep_logic = Episode()
         self.pod_logic = Podcast()
-        self.main_ui.bottom_frame.change_title.trace('w', self.changing_title)
-        self.episode_frame = EpisodeFrame(self.main_ui.middle_frame.input_frame_left)
-        self.n_clips_frame = NClipsFrame(self.main_ui.middle_frame.input_frame_left)
-        self.pod_frame = PodFrame(self.main_ui.middle_frame.input_frame_left)
-        self.clips_frame = ClipsFrame(self.main_ui.middle_frame.input_frame_right)
-        self.episode_url_frame = EpisodeURLFrame(self.main_ui.middle_frame.results_frame)
-        self.publish_email_frame = PublishEmailFrame(self.main_ui.middle_frame.results_frame)
-        self.site_email_frame = SiteEmailFrame(self.main_ui.middle_frame.results_frame)
+        self.episode_frame = EpisodeFrame(self.input_frame_left)
+        self.n_clips_frame = NClipsFrame(self.input_frame_left)
+        self.pod_frame = PodFrame(self.input_frame_left)
+        self.clips_frame = ClipsFrame(self.input_frame_right)
+        self.episode_url_frame = EpisodeURLFrame(self.results_frame)
+        self.publish_email_frame = PublishEmailFrame(self.results_frame)
+        self.site_email_frame = SiteEmailFrame(self.results_frame)
         self.site_email_frame.button.configure(text="Email", command=self.email_site)
-        self.podcast_email_frame = PodcastEmailFrame(self.main_ui.middle_frame.results_frame)
+        self.podcast_email_frame = PodcastEmailFrame(self.results_frame)
         self.podcast_email_frame.button.configure(text="Email", command=self.email_podcast)
         # Initial Logic Set
-        self.update_logic()
         self.update_guest()
         # Traces
         self.n_clips_frame.scale.value.trace(
             'w', lambda var_name, var_index, operation: self.clips_frame.show_or_hide_clips(
                 self.n_clips_frame.scale.value.get()))
 
-        self.main_ui.bottom_frame.username.ready.trace('w', self.update_logic)
         self.episode_frame.ep_title.ready.trace('w', self.update_logic)
         self.episode_frame.ep_season.ready.trace('w', self.update_logic)
         self.episode_frame.ep_number.ready.trace('w', self.update_logic)
@@ -743,7 +2347,62 @@ class EpisodeApp(Window):
         self.episode_frame.ready.trace('w', self.update_results)
         self.pod_frame.ready.trace('w', self.update_results)
         self.clips_frame.ready.trace('w', self.update_results)
-        self.update()
+        self.episode_frame.ep_season.output.trace('w', self.autofill_uuids)
+        self.episode_frame.ep_number.output.trace('w', self.autofill_uuids)
+        [clip.title.output.trace('w', self.autofill_uuids) for clip in self.clips_frame.clips[1:]]
+
+    # Called when this tab is brought to the front.
+    def show(self):
+        self.autofill_uuids()
+        if self.dirty:
+            self.update_logic()
+
+    @property
+    def show_name(self):
+        return "Title 2" if self.title_changed else "Title 1"
+
+    # Whether anything has been typed into this tab, so closing it can ask first.
+    @property
+    def has_input(self):
+        widgets = self.winfo_children()
+        while widgets:
+            widget = widgets.pop()
+            if isinstance(widget, EntryCustom) and widget.output.get():
+                return True
+            widgets.extend(widget.winfo_children())
+        return False
+
+    @property
+    def tab_name(self):
+        if self.episode_frame.ep_season.ready.get() and self.episode_frame.ep_number.ready.get():
+            return "S{} E{}".format(self.episode_frame.ep_season.output.get(),
+                                    self.episode_frame.ep_number.output.get())
+        return "New Episode"
+
+    # Only links that are actually ready get checked, a half typed form would just be red everywhere.
+    def check_links(self):
+        problems = []
+        if self.app.link_validator is not None and self.episode_frame.ready.get():
+            row = {"url": self.ep_logic.url}
+            if self.clips_frame.ready.get():
+                row["clip_urls"] = [clip.url for clip in self.ep_logic.clips[1:]]
+            problems = self.app.link_validator.check_row(row)
+        self.episode_url_frame.show_link_problems(problems)
+
+    # noinspection PyUnusedLocal
+    def autofill_uuids(self, *args, **kwargs):
+        cms_index = self.app.cms_index
+        if cms_index is None:
+            return
+        season = self.episode_frame.ep_season.output.get()
+        number = self.episode_frame.ep_number.output.get()
+        if not season or not number:
+            return
+        self.episode_frame.ep_uuid.autofill(cms_index.episode_uuid(season, number))
+        for clip in self.clips_frame.clips[1:]:
+            title = clip.title.output.get()
+            if title:
+                clip.uuid.autofill(cms_index.clip_uuid(season, number, title))
 
     def email_site(self):
         if sys.platform == "darwin":
@@ -776,8 +2435,14 @@ class EpisodeApp(Window):
 
     # noinspection PyUnusedLocal
     def update_logic(self, *args, **kwargs):
-        self.ep_logic.username = self.main_ui.bottom_frame.username.get()
-        self.pod_logic.username = self.main_ui.bottom_frame.username.get()
+        # Tabs in the background just remember they're out of date until they're shown.
+        if self.app.current_workspace is not self:
+            self.dirty = True
+            return
+        self.dirty = False
+        self.ep_logic.username = self.app.main_ui.bottom_frame.username.get()
+        self.pod_logic.username = self.app.main_ui.bottom_frame.username.get()
+        self.ep_logic.show = self.pod_logic.show = self.show_name
         self.ep_logic.title = self.episode_frame.ep_title.get()
         self.ep_logic.season = self.episode_frame.ep_season.get()
         self.ep_logic.number = self.episode_frame.ep_number.get()
@@ -797,8 +2462,8 @@ class EpisodeApp(Window):
         self.pod_logic.adlocations = (self.pod_frame.pod_adlocations.get()).split(", ")
         self.pod_logic.midroll_ads = self.pod_frame.pod_midroll_adv.get()
         self.pod_logic.postroll_ads = self.pod_frame.pod_postroll_adv.get()
-        self.ep_logic.Clip.guest_list = self.ep_logic.guest_list
         self.update_results()
+        self.app.name_tab(self)
 
     # noinspection PyUnusedLocal
     def update_results(self, *args, **kwargs):
@@ -870,6 +2535,7 @@ class EpisodeApp(Window):
             self.podcast_email_frame.podcast_email_subject.configure(state='disabled')
             self.podcast_email_frame.podcast_email_body.configure(state='disabled')
             self.podcast_email_frame.button.configure(state='disabled')
+        self.check_links()
 
     # noinspection PyUnusedLocal
     def update_guest(self, *args, **kwargs):
@@ -880,8 +2546,183 @@ class EpisodeApp(Window):
             self.episode_frame.ep_guest.placeholder = self.ep_logic.guest
             self.episode_frame.ep_guest.configure(state='normal')
 
+
+class EpisodeApp(Window):
+    def __init__(self, cms_export=None, sitemap=None, *args, **kwargs):
+        Window.__init__(self, *args, **kwargs)
+        self.title("Title 1")
+        self.main_ui = MainUILayout(self)
+        self.workspaces = []
+        self.current_workspace = None
+        self.cms_index = None
+        self.link_validator = None
+        self.loading = set()
+        self.main_ui.bottom_frame.change_title.trace('w', self.changing_title)
+        self.main_ui.bottom_frame.cms_button.configure(command=self.choose_cms_export)
+        self.main_ui.bottom_frame.sitemap_button.configure(command=self.choose_sitemap)
+        self.main_ui.top_frame.new_tab_button.configure(command=self.new_workspace)
+        self.main_ui.top_frame.close_tab_button.configure(command=self.close_workspace)
+        self.main_ui.middle_frame.tabs.bind("<<NotebookTabChanged>>", self.tab_changed)
+        self.bind_tab_keys()
+        self.new_workspace()
+        self.schedule_date_change()
+        # Traces
+        self.main_ui.bottom_frame.username.ready.trace('w', self.update_logic)
+        if cms_export is not None:
+            self.load_cms_export(cms_export)
+        if sitemap is not None:
+            self.load_sitemap(sitemap)
+        self.update()
+
+    def bind_tab_keys(self):
+        modifier = "Command" if sys.platform == "darwin" else "Control"
+
+        # noinspection PyUnusedLocal
+        def new_tab(event):
+            self.new_workspace()
+            return "break"
+
+        # noinspection PyUnusedLocal
+        def close_tab(event):
+            self.close_workspace()
+            return "break"
+
+        for sequence, handler in (('<{}-t>'.format(modifier), new_tab), ('<{}-w>'.format(modifier), close_tab)):
+            # Entry and Text have their own Control-t (swap two characters) that runs before the
+            # window's binding, so the shortcut replaces it on those classes, and the "break"
+            # keeps the window binding from opening a second tab.
+            self.bind_class("Entry", sequence, handler)
+            self.bind_class("Text", sequence, handler)
+            self.bind(sequence, handler)
+
+    def new_workspace(self):
+        workspace = EpisodeWorkspace(self, self.main_ui.middle_frame.tabs)
+        self.workspaces.append(workspace)
+        self.main_ui.middle_frame.tabs.add(workspace, text=workspace.tab_name)
+        self.main_ui.middle_frame.tabs.select(workspace)
+        # <<NotebookTabChanged>> only arrives once we're back in the event loop.
+        self.show_workspace(workspace)
+        return workspace
+
+    def close_workspace(self):
+        if len(self.workspaces) < 2:
+            return
+        workspace = self.current_workspace
+        if workspace.has_input and not tkMessageBox.askyesno(
+                "Close Tab", "Close {}? Everything typed into it will be lost.".format(workspace.tab_name),
+                parent=self):
+            return
+        self.workspaces.remove(workspace)
+        self.current_workspace = None
+        self.main_ui.middle_frame.tabs.forget(workspace)
+        workspace.destroy()
+        self.show_workspace(self.nametowidget(self.main_ui.middle_frame.tabs.select()))
+
+    # noinspection PyUnusedLocal
+    def tab_changed(self, *args, **kwargs):
+        selected = self.main_ui.middle_frame.tabs.select()
+        if selected:
+            self.show_workspace(self.nametowidget(selected))
+
+    def show_workspace(self, workspace):
+        if workspace is self.current_workspace:
+            return
+        self.current_workspace = workspace
+        self.main_ui.bottom_frame.change_title.set(workspace.title_changed)
+        workspace.show()
+
+    # Re-render when the air date rolls over, otherwise a window left open past the cutoff
+    # would keep showing yesterday's date.
+    def schedule_date_change(self):
+        next_change = min(air_dates.next_change(show) for show in SHOW_CUTOFFS)
+        delay = (next_change - datetime.datetime.now()).total_seconds()
+        self.after(int(max(delay, 0) * 1000) + 1000, self.date_changed)
+
+    def date_changed(self):
+        self.update_logic()
+        self.schedule_date_change()
+
+    def name_tab(self, workspace):
+        self.main_ui.middle_frame.tabs.tab(workspace, text=workspace.tab_name)
+
+    # noinspection PyUnusedLocal
+    def update_logic(self, *args, **kwargs):
+        for workspace in self.workspaces:
+            workspace.update_logic()
+
+    def choose_cms_export(self):
+        path = tkFileDialog.askopenfilename(title="Load CMS Export",
+                                            filetypes=[("CMS Export", "*.csv *.json *.ndjson"), ("All Files", "*")])
+        if path:
+            self.load_cms_export(path)
+
+    def choose_sitemap(self):
+        path = tkFileDialog.askopenfilename(title="Load Sitemap",
+                                            filetypes=[("Sitemap", "*.xml *.txt"), ("All Files", "*")])
+        if path:
+            self.load_sitemap(path)
+
+    # Big CMS exports and sitemaps take a while to load, so that happens on a background thread
+    # and we poll for it from Tk's event loop rather than freezing the window. Tk itself only
+    # ever gets touched from this thread.
+    def load_in_background(self, kind, status, path, build, loaded):
+        if kind in self.loading:
+            return
+        self.loading.add(kind)
+        name = os.path.basename(path)
+        status.configure(text="Loading {}...".format(name))
+        result = {}
+
+        def run():
+            try:
+                result["value"] = build(path)
+            except (IOError, OSError, ValueError, TypeError, AttributeError, csv.Error, sqlite3.Error,
+                    mmap.error) as error:
+                result["error"] = error
+
+        def check():
+            if loader.is_alive():
+                self.after(100, check)
+                return
+            self.loading.discard(kind)
+            if "value" not in result:
+                # No value and no error means the thread died of something we didn't expect.
+                status.configure(text="Couldn't load {}: {}".format(name, result.get("error", "unexpected error")))
+            else:
+                loaded(result["value"], name)
+
+        loader = threading.Thread(target=run)
+        loader.daemon = True
+        loader.start()
+        self.after(100, check)
+
+    def load_cms_export(self, path):
+        self.load_in_background("cms", self.main_ui.bottom_frame.cms_status, path, CMSIndex, self.cms_export_loaded)
+
+    def cms_export_loaded(self, cms_index, name):
+        if self.cms_index is not None:
+            self.cms_index.close()
+        self.cms_index = cms_index
+        self.main_ui.bottom_frame.cms_status.configure(text="UUIDs from {}".format(name))
+        # The other tabs fill theirs in when they're shown.
+        self.current_workspace.autofill_uuids()
+
+    def load_sitemap(self, path):
+        self.load_in_background("sitemap", self.main_ui.bottom_frame.sitemap_status, path, LinkValidator,
+                                self.sitemap_loaded)
+
+    def sitemap_loaded(self, link_validator, name):
+        self.link_validator = link_validator
+        self.main_ui.bottom_frame.sitemap_status.configure(
+            text="Checking links against {} ({} pages)".format(name, len(link_validator)))
+        self.update_logic()
+
     # noinspection PyUnusedLocal
     def changing_title(self, *args, **kwargs):
+        if self.current_workspace is not None and \
+                self.current_workspace.title_changed != self.main_ui.bottom_frame.change_title.get():
+            self.current_workspace.title_changed = self.main_ui.bottom_frame.change_title.get()
+            self.current_workspace.update_logic()
         if self.main_ui.bottom_frame.change_title.get():
             self.title("Title 2")
             self.main_ui.top_frame.subtitle.configure(text="a.k.a. TITLE2")
@@ -890,6 +2731,321 @@ class EpisodeApp(Window):
             self.main_ui.top_frame.subtitle.configure(text="a.k.a. TITLE1")
 
 
-if __name__ == '__main__':
-    root = EpisodeApp()
+def open_render_cache(args):
+    if args.no_cache:
+        return None
+    return RenderCache(args.cache_dir, max_bytes=args.cache_max_mb << 20)
+
+
+def add_render_cache_arguments(parser):
+    parser.add_argument("--cache-dir", default=RENDER_CACHE_DIR, help="where rendered rows are cached")
+    parser.add_argument("--cache-max-mb", type=int, default=RENDER_CACHE_MAX_BYTES >> 20,
+                        help="evict least recently used rows past this size")
+    parser.add_argument("--no-cache", action="store_true", help="always render, don't read or write the cache")
+
+
+def record_name(record):
+    if isinstance(record, dict):
+        return "S{} E{}".format(record_text(record.get("season")), record_text(record.get("number")))
+    return "record"
+
+
+# The rejected callback for export and archive. Only the count is kept, so a big file full of
+# bad records doesn't pile up in memory.
+class SkippedRecords(object):
+    def __init__(self, stream=None):
+        self.stream = stream if stream is not None else sys.stderr
+        self.count = 0
+
+    def __call__(self, record, problems):
+        self.count += 1
+        self.stream.write("Skipped {}: {}\n".format(record_name(record), "; ".join(problems)))
+
+
+def parse_day(value):
+    try:
+        return AirDates.parse(value, DATE_INPUT_FORMATS).date()
+    except ValueError as error:
+        raise argparse.ArgumentTypeError(str(error))
+
+
+def add_archive_slice_arguments(parser):
+    parser.add_argument("--season", type=int, help="only this season")
+    parser.add_argument("--since", type=parse_day, help="only episodes that aired on or after this date")
+    parser.add_argument("--until", type=parse_day, help="only episodes that aired on or before this date")
+
+
+def archive_rows(archive, args):
+    if args.season is None and args.since is None and args.until is None:
+        return None
+    return archive.select(season=args.season, date_from=args.since, date_to=args.until)
+
+
+def run_export(args):
+    if args.input != "-" and not os.path.isfile(args.input):
+        sys.stderr.write("No such file: {}\n".format(args.input))
+        return 1
+    skipped = SkippedRecords()
+    archive = None
+    if is_archive(args.input):
+        archive = open_archive(args.input)
+        if archive is None:
+            return 1
+        input_stream = None
+        records = archive.records(archive_rows(archive, args))
+    else:
+        if args.season is not None or args.since is not None or args.until is not None:
+            sys.stderr.write("--season, --since and --until only work on {} archives\n".format(ARCHIVE_SUFFIX))
+            return 2
+        if args.input == "-":
+            input_stream = sys.stdin
+        else:
+            input_stream = open(args.input, "rb", EXPORT_BUFFER_SIZE)
+        records = air_dates.resolve(iter_records(input_stream, rejected=skipped))
+    if args.output == "-":
+        output_stream = sys.stdout
+    else:
+        output_stream = open(args.output, "wb", EXPORT_BUFFER_SIZE)
+    render_cache = open_render_cache(args)
+    link_validator = LinkValidator(args.sitemap) if args.sitemap else None
+    try:
+        count = export_outputs(records, output_stream, args.format,
+                               render=render_cache.render if render_cache is not None else render_record,
+                               link_validator=link_validator, rejected=skipped)
+    finally:
+        if archive is not None:
+            archive.close()
+        elif input_stream is not sys.stdin:
+            input_stream.close()
+        if output_stream is not sys.stdout:
+            output_stream.close()
+    sys.stderr.write("Exported {} episode(s), skipped {} invalid\n".format(count, skipped.count))
+    if render_cache is not None:
+        sys.stderr.write(render_cache.summary() + "\n")
+    if link_validator is not None:
+        sys.stderr.write(link_validator.summary() + "\n")
+    return 1 if skipped.count else 0
+
+
+def run_archive(args):
+    if args.input != "-" and not os.path.isfile(args.input):
+        sys.stderr.write("No such file: {}\n".format(args.input))
+        return 1
+    skipped = SkippedRecords()
+    started = time.time()
+    if args.input == "-":
+        episodes, clips = write_archive(air_dates.resolve(iter_records(sys.stdin, rejected=skipped)), args.output,
+                                        rejected=skipped)
+    else:
+        with open(args.input, "rb", EXPORT_BUFFER_SIZE) as input_stream:
+            episodes, clips = write_archive(air_dates.resolve(iter_records(input_stream, rejected=skipped)),
+                                            args.output, rejected=skipped)
+    sys.stderr.write("Archived {} episode(s) and {} clip(s) to {} in {:.2f}s, skipped {} invalid\n".format(
+        episodes, clips, args.output, time.time() - started, skipped.count))
+    return 1 if skipped.count else 0
+
+
+def run_report(args):
+    archive = open_archive(args.archive)
+    if archive is None:
+        return 1
+    with archive:
+        rows = archive_rows(archive, args)
+        if rows is None:
+            report = archive.season_report()
+        else:
+            report = {}
+            for row in rows:
+                episodes, clips = report.get(archive.value("season_n", row), (0, 0))
+                report[archive.value("season_n", row)] = (episodes + 1, clips + archive.value("clip_count", row))
+    writer = csv.writer(sys.stdout, lineterminator="\n")
+    writer.writerow(("season", "episodes", "clips"))
+    for season in sorted(report):
+        writer.writerow((season,) + report[season])
+    return 0
+
+
+def run_bench_archive(args):
+    archive = open_archive(args.archive)
+    if archive is None:
+        return 1
+    archive.close()
+    if args.csv:
+        csv_path = args.csv
+    else:
+        csv_path = os.path.splitext(args.archive)[0] + ".bench.csv"
+    results = benchmark_archive(args.archive, csv_path, repeat=args.repeat)
+    print("{} ({} bytes) vs {} ({} bytes), best of {}".format(
+        args.archive, os.path.getsize(args.archive), csv_path, os.path.getsize(csv_path), args.repeat))
+    for name, (seconds, count) in results:
+        print("{:<30} {:>9.1f}ms  ({})".format(name, seconds * 1000, count))
+    if not args.csv:
+        os.remove(csv_path)
+    return 0
+
+
+def run_serve(args):
+    render_cache = open_render_cache(args)
+    server = RenderServer((args.host, args.port), workers=args.workers, verbose=args.verbose,
+                          render_cache=render_cache)
+    sys.stderr.write("Serving renders on http://{}:{} with {} workers\n".format(
+        args.host, server.server_port, args.workers))
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        if render_cache is not None:
+            sys.stderr.write(render_cache.summary() + "\n")
+    return 0
+
+
+def run_app(args):
+    root = EpisodeApp(cms_export=args.cms_export, sitemap=args.sitemap)
     root.mainloop()
+    return 0
+
+
+def run_cms_index(args):
+    if not os.path.isfile(args.export):
+        sys.stderr.write("No such file: {}\n".format(args.export))
+        return 1
+    started = time.time()
+    index = CMSIndex(args.export)
+    episodes, clips = index.counts
+    print("{} {} episode and {} clip UUIDs from {} in {:.2f}s".format(
+        "Indexed" if index.rebuilt else "Up to date:", episodes, clips, args.export, time.time() - started))
+    if args.season and args.number:
+        if args.clip_title:
+            print(record_text(index.clip_uuid(args.season, args.number, args.clip_title)))
+        else:
+            print(record_text(index.episode_uuid(args.season, args.number)))
+    index.close()
+    return 0
+
+
+def run_load_test(args):
+    if args.record:
+        with open(args.record, "rb") as record_file:
+            records = list(iter_records(record_file))
+    else:
+        records = [{"title": "The Episode - Guest Name", "season": "24", "number": "001", "uuid": "0" * 32,
+                    "username": "First Last",
+                    "clips": [{"title": "Clip {}".format(n), "description": "Description {}".format(n),
+                               "uuid": str(n) * 32} for n in range(1, 5)]}]
+    body = json.dumps(records[0] if len(records) == 1 else {"episodes": records})
+    result = load_test(args.host, args.port, body, clients=args.clients, requests_per_client=args.requests)
+    print("{requests} requests ({errors} errors) in {seconds:.2f}s, {requests_per_second:.0f} req/s, "
+          "p50 {p50_ms:.2f}ms, p99 {p99_ms:.2f}ms".format(**result))
+    return 1 if result["errors"] else 0
+
+
+def run_watch(args):
+    if not os.path.isdir(args.directory):
+        sys.stderr.write("No such directory: {}\n".format(args.directory))
+        return 1
+    render_cache = open_render_cache(args)
+    watcher = FolderWatcher(args.directory,
+                            render=render_cache.render if render_cache is not None else render_record,
+                            link_validator=LinkValidator(args.sitemap) if args.sitemap else None,
+                            rescan_interval=args.rescan,
+                            log=lambda message: sys.stderr.write(message + "\n"))
+    try:
+        if args.once:
+            watcher.poll()
+        else:
+            sys.stderr.write("Watching {}\n".format(args.directory))
+            watcher.watch(args.interval)
+    except KeyboardInterrupt:
+        pass
+    sys.stderr.write("Rendered {} file(s), {} failed\n".format(watcher.rendered, watcher.failed))
+    if render_cache is not None:
+        sys.stderr.write(render_cache.summary() + "\n")
+    return 1 if args.once and watcher.failed else 0
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(prog="EpisodeMono.py",
+                                     description="Episode tools. Run without arguments to open the app.")
+    subparsers = parser.add_subparsers(dest="command")
+
+    app_parser = subparsers.add_parser("app", help="open the app (the default with no arguments)")
+    app_parser.add_argument("--cms-export", help="CMS export (CSV, JSON or NDJSON) to fill in UUIDs from")
+    app_parser.add_argument("--sitemap", help="sitemap XML or URL list to check generated links against")
+    app_parser.set_defaults(func=run_app)
+
+    cms_index_parser = subparsers.add_parser("cms-index", help="index a CMS export ahead of time and look up UUIDs")
+    cms_index_parser.add_argument("export", help="CMS export (CSV, JSON or NDJSON)")
+    cms_index_parser.add_argument("--season")
+    cms_index_parser.add_argument("--number")
+    cms_index_parser.add_argument("--clip-title")
+    cms_index_parser.set_defaults(func=run_cms_index)
+
+    export_parser = subparsers.add_parser("export", help="render NDJSON episode records to NDJSON or CSV")
+    export_parser.add_argument("input", help="NDJSON file with one episode record per line, - for stdin, "
+                                             "or a {} archive".format(ARCHIVE_SUFFIX))
+    export_parser.add_argument("-o", "--output", default="-", help="output file, or - for stdout (default)")
+    export_parser.add_argument("-f", "--format", choices=EXPORT_FORMATS, default="ndjson")
+    export_parser.add_argument("--sitemap", help="sitemap XML or URL list; adds a link_problems column")
+    add_archive_slice_arguments(export_parser)
+    add_render_cache_arguments(export_parser)
+    export_parser.set_defaults(func=run_export)
+
+    archive_parser = subparsers.add_parser("archive", help="pack NDJSON episode records into a columnar archive")
+    archive_parser.add_argument("input", help="NDJSON file with one episode record per line, or - for stdin")
+    archive_parser.add_argument("output", help="archive to write, usually *{}".format(ARCHIVE_SUFFIX))
+    archive_parser.set_defaults(func=run_archive)
+
+    report_parser = subparsers.add_parser("report", help="episodes and clips per season in an archive, as CSV")
+    report_parser.add_argument("archive")
+    add_archive_slice_arguments(report_parser)
+    report_parser.set_defaults(func=run_report)
+
+    bench_parser = subparsers.add_parser("bench-archive", help="time loading an archive against the same data as CSV")
+    bench_parser.add_argument("archive")
+    bench_parser.add_argument("--csv", help="keep the CSV copy here (it's a temp file next to the archive otherwise)")
+    bench_parser.add_argument("--repeat", type=int, default=3)
+    bench_parser.set_defaults(func=run_bench_archive)
+
+    serve_parser = subparsers.add_parser("serve", help="run the localhost render service")
+    serve_parser.add_argument("--host", default=SERVE_HOST)
+    serve_parser.add_argument("--port", type=int, default=SERVE_PORT)
+    serve_parser.add_argument("--workers", type=int, default=SERVE_WORKERS)
+    serve_parser.add_argument("-v", "--verbose", action="store_true", help="log every request")
+    add_render_cache_arguments(serve_parser)
+    serve_parser.set_defaults(func=run_serve)
+
+    watch_parser = subparsers.add_parser("watch", help="render episode records dropped into a folder")
+    watch_parser.add_argument("directory", help="folder of *.json episode records")
+    watch_parser.add_argument("--interval", type=float, default=WATCH_POLL_INTERVAL, help="seconds between checks")
+    watch_parser.add_argument("--rescan", type=float, default=WATCH_RESCAN_INTERVAL,
+                              help="seconds between full checks for files rewritten in place")
+    watch_parser.add_argument("--once", action="store_true", help="render whatever is new and exit")
+    watch_parser.add_argument("--sitemap", help="sitemap XML or URL list; adds link_problems to the output")
+    add_render_cache_arguments(watch_parser)
+    watch_parser.set_defaults(func=run_watch)
+
+    load_test_parser = subparsers.add_parser("loadtest", help="load test a running render service")
+    load_test_parser.add_argument("--host", default=SERVE_HOST)
+    load_test_parser.add_argument("--port", type=int, default=SERVE_PORT)
+    load_test_parser.add_argument("--clients", type=int, default=4, help="concurrent keep-alive connections")
+    load_test_parser.add_argument("--requests", type=int, default=250, help="requests per connection")
+    load_test_parser.add_argument("--record", help="NDJSON records to send, as a batch if more than one")
+    load_test_parser.set_defaults(func=run_load_test)
+
+    return parser
+
+
+def main(argv=None):
+    if argv is None:
+        # Py2App launches on older macOS hand us a "-psn_..." process serial number, ignore it.
+        argv = [arg for arg in sys.argv[1:] if not arg.startswith("-psn")]
+    if not argv:
+        argv = ["app"]
+    args = build_parser().parse_args(argv)
+    return args.func(args)
+
+
+if __name__ == '__main__':
+    sys.exit(main())